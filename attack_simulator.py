@@ -0,0 +1,146 @@
+import argparse
+import itertools
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from automated_guesser import AutomatedGuesser, GUESS_BATCH
+
+# Parameter grids: every combination is a case, attacked by independent random quizzes
+GRIDS = {
+    'quick': {
+        'groups': [3, 4],
+        'validation_size': [1, 2],
+        'questions_per_group': [1, 2],
+        'cost_of_mistake': [0, 10],
+        'options': [4],
+        'max_guesses': [10 ** 5],
+    },
+    'full': {
+        'groups': [4, 6, 10],
+        'validation_size': [1, 2, 3, 5],
+        'questions_per_group': [1, 2, 3],
+        'cost_of_mistake': [0, 10, 50],
+        'options': [4],
+        'max_guesses': [10 ** 6],
+    },
+}
+# Quantiles of guesses-to-success reported per case, over the trials that succeeded
+QUANTILES = [0.5, 0.9, 0.99]
+# Trials per pool task, enough to amortize the task overhead on quick cases
+TRIALS_PER_TASK = 25
+
+
+def grid_cases(grid: str) -> List[Dict]:
+    params = GRIDS[grid]
+    cases = [dict(zip(params, values)) for values in itertools.product(*params.values())]
+    return [case for case in cases if case['validation_size'] <= case['groups']]
+
+def trial_seed(seed: int, case_index: int, trial: int) -> int:
+    """Seed of one trial, independent of how trials are spread over workers"""
+    return int(np.random.SeedSequence([seed, case_index, trial]).generate_state(1)[0])
+
+def run_trial(case: Dict, seed: int) -> Optional[int]:
+    """Attack one random quiz like test_automated_guesser, return the guesses it took or None
+
+    The quiz has groups of questions_per_group questions, the validation set is validation_size
+    groups in random order, every answer is one of options capitals and the hash adds a cost
+    between 0 and cost_of_mistake. A guess only succeeds if it also guesses that cost.
+    Wrong guesses do not update the guesser: its posterior keeps per-question marginals, not
+    the slot order check_guesses compares, so the update would not cut the guesses needed.
+    """
+    np.random.seed(seed)
+    questions_per_group = case['questions_per_group']
+    validation_groups = np.random.permutation(case['groups'])[:case['validation_size']]
+    validation_ids = (validation_groups[:, None] * questions_per_group + np.arange(questions_per_group)).ravel()
+    answers_ids = np.random.randint(case['options'], size=len(validation_ids))
+    cost = np.random.randint(case['cost_of_mistake'] + 1)
+
+    guesser = AutomatedGuesser(
+        case['options'],
+        np.arange(case['groups'] * questions_per_group),
+        validation_ids,
+        answers_ids,
+        case['cost_of_mistake'] + 1
+    )
+    guess_count = 0
+    while guess_count < case['max_guesses']:
+        batch_size = min(GUESS_BATCH, case['max_guesses'] - guess_count)
+        question_ids, guesses_ids = guesser.make_guesses(batch_size)
+        correct = guesser.check_guesses(question_ids, guesses_ids)
+        correct &= np.random.randint(case['cost_of_mistake'] + 1, size=batch_size) == cost
+        hits = np.flatnonzero(correct)
+        if len(hits):
+            return guess_count + int(hits[0]) + 1
+        guess_count += batch_size
+    return None
+
+def run_trials(case: Dict, case_index: int, seed: int, trials: range) -> List[Tuple[int, int, Optional[int]]]:
+    """Run a slice of one case's trials inside a pool worker, as (case index, trial, guesses)"""
+    return [(case_index, trial, run_trial(case, trial_seed(seed, case_index, trial))) for trial in trials]
+
+def simulate(cases: List[Dict], trials: int, seed: int = 0, workers: int = 1) -> pd.DataFrame:
+    """Run trials attacks on every case over a process pool, one row per trial
+
+    Failed trials have NaN guesses. Results are the same for any number of workers.
+    """
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(run_trials, case, case_index, seed, range(start, min(start + TRIALS_PER_TASK, trials)))
+            for case_index, case in enumerate(cases)
+            for start in range(0, trials, TRIALS_PER_TASK)
+        ]
+        for future in futures:
+            for case_index, trial, guesses in future.result():
+                rows.append({**cases[case_index], 'trial': trial, 'guesses': guesses})
+    results = pd.DataFrame(rows)
+    results['guesses'] = results['guesses'].astype(float)
+    return results
+
+def summarize(results: pd.DataFrame) -> pd.DataFrame:
+    """Success rate per case, with the mean and quantiles of guesses over its successful trials"""
+    params = [column for column in results.columns if column not in ('trial', 'guesses')]
+    grouped = results.groupby(params, sort=False)['guesses']
+    summary = grouped.agg(trials='size', successes='count')
+    summary['success_rate'] = summary['successes'] / summary['trials']
+    summary['mean_guesses'] = grouped.mean()
+    for q in QUANTILES:
+        summary[f"p{round(q * 100)}_guesses"] = grouped.quantile(q)
+    return summary.reset_index()
+
+def write_table(df: pd.DataFrame, path: str):
+    """Write a table as Parquet for .parquet paths, CSV otherwise"""
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Monte Carlo attacks of AutomatedGuesser on random quizzes")
+    parser.add_argument('--grid', choices=sorted(GRIDS), default='quick')
+    parser.add_argument('--trials', type=int, default=1000, help="random quizzes attacked per case")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('-o', '--output', help="summary table, .csv or .parquet")
+    parser.add_argument('--trials-output', help="table of every trial, .csv or .parquet")
+    args = parser.parse_args(argv)
+
+    started_at = time.monotonic()
+    results = simulate(grid_cases(args.grid), args.trials, args.seed, args.workers)
+    summary = summarize(results)
+    print(summary.to_string(index=False))
+    print(f"{len(results)} trials in {time.monotonic() - started_at:.1f}s", file=sys.stderr)
+    if args.output:
+        write_table(summary, args.output)
+    if args.trials_output:
+        write_table(results, args.trials_output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,8 @@
 import numpy as np
-from typing import List, Dict, Set, Optional
+from typing import List, Dict, Set, Optional, Tuple
+
+# Guesses drawn and checked per batch, a (GUESS_BATCH, num_test) key matrix stays a few MB
+GUESS_BATCH = 10000
 
 class AutomatedGuesser:
     def __init__(
@@ -7,7 +10,8 @@ class AutomatedGuesser:
             num_capitals: List[str], 
             test_countries_ids: List[str], 
             validation_countries_ids: List[str], 
-            validation_capitals_ids: List[str]
+            validation_capitals_ids: List[str],
+            num_costs: int = 1
         ):
         self.test_countries_ids = test_countries_ids
         self.num_test = len(test_countries_ids)
@@ -16,41 +20,106 @@ class AutomatedGuesser:
         self.num_capitals = num_capitals
         self.guesses = np.ones(self.num_test)*(-1)
         self.answers_ids = validation_capitals_ids
-        self.probs = np.ones(self.num_test) / self.num_test
-        self.alpha = 0.01
+        # Posterior that each question is in the validation set, summing to num_validation,
+        # and over each question's answer given that it is. probs samples questions from it.
+        self.membership = np.full(self.num_test, self.num_validation / self.num_test)
+        self.answer_probs = np.full((self.num_test, self.num_capitals), 1 / self.num_capitals)
+        self.probs = self.membership / self.num_validation
+        # A guess is also wrong when the hidden cost was missed, one in num_costs times
+        self.num_costs = num_costs
+        self._sorter = np.argsort(test_countries_ids)
         
     def make_guess(self) -> List[str]:
         """Make a guess based on current probability distributions"""
+        question_ids, guesses_ids = self.make_guesses(1)
+        return question_ids[0], guesses_ids[0]
+
+    def make_guesses(self, batch_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Make batch_size guesses at once, as two (batch_size, num_validation) matrices
+
+        Every row draws num_validation questions without replacement, weighted by probs, in
+        the same order sequential np.random.choice draws would: each question gets an
+        exponential key with rate probs, and the num_validation smallest keys win in
+        increasing order. Unknown answers are filled with random capitals in one step.
+        """
+        with np.errstate(divide='ignore'):
+            keys = np.random.exponential(size=(batch_size, self.num_test)) / self.probs
+        chosen = np.argpartition(keys, self.num_validation - 1, axis=1)[:, :self.num_validation]
+        order = np.argsort(np.take_along_axis(keys, chosen, axis=1), axis=1)
+        question_ids = np.take_along_axis(chosen, order, axis=1)
 
-        question_ids = np.random.choice(
-            self.num_test, 
-            size=self.num_validation, 
-            replace=False,
-            p=self.probs
-        )
-        
         guesses_ids = self.guesses[question_ids]
-        s = np.sum(guesses_ids == -1)
-        guesses_ids[guesses_ids == -1] = np.random.choice(self.num_capitals, size=s)
+        unknown = guesses_ids == -1
+        # Inverse CDF sampling of every unknown answer in one searchsorted: row r of the
+        # answer CDFs is shifted into (r, r + 1], so r + u falls inside its own row
+        rows = question_ids[unknown]
+        cdf = np.cumsum(self.answer_probs, axis=1)
+        cdf /= cdf[:, -1:]
+        cdf += np.arange(self.num_test)[:, None]
+        samples = np.searchsorted(cdf.ravel(), rows + np.random.random(len(rows)), side='right')
+        guesses_ids[unknown] = np.minimum(samples - rows * self.num_capitals, self.num_capitals - 1)
         return self.test_countries_ids[question_ids], guesses_ids
     
-    def update_after_wrong_guess(self, question_idx: int):
-        """Update probabilities after a wrong guess"""
-        # Lower probability that this question is in validation set
-        guessed_sum = self.p[question_idx].sum()
-        self.probs *= (1-guessed_sum+self.alpha*self.num_validation) / (1-guessed_sum)
-        self.probs[question_idx] *= (1-guessed_sum) / (1-guessed_sum+self.alpha*self.num_validation)
-        self.probs[question_idx] -= self.alpha
-        self.probs = np.clip(self.probs, 0, 1)
-        return
+    def update_after_wrong_guess(self, question_ids: np.ndarray, guesses_ids: np.ndarray):
+        """Update the posterior after a batch of wrong guesses from make_guesses
 
-    
-    def update_after_new_info(self, question_idx: int, guess_idx: str):
-        """Update probabilities after receiving new information"""
-        self.probs *= 0.1 / (1 - min(self.probs[question_idx]), 0.9)
-        self.probs[question_idx] = max(0.9, self.probs[question_idx])
-        self.guesses[question_idx] = guess_idx
-        return
+        Slots of a guess are treated as independent: slot i is right with probability
+        membership / num_validation * answer_probs, and the guess is wrong unless every slot
+        and the cost are right. Each slot's (question, answer) mass then shrinks by Bayes'
+        rule given the guess was wrong, the factors of the whole batch are applied at once
+        and membership is renormalized to sum to num_validation.
+
+        The posterior only keeps marginals, not the slot order the check compares, so a wrong
+        guess mostly tells it about the order it cannot record. Against random guessing it does
+        not cut the guesses needed, it keeps leaked answers and answer priors consistent.
+        """
+        question_idx = self._question_indices(np.atleast_2d(question_ids))
+        guesses_ids = np.atleast_2d(guesses_ids).astype(int)
+        slot_probs = self.membership[question_idx] / self.num_validation * self.answer_probs[question_idx, guesses_ids]
+        guess_probs = slot_probs.prod(axis=1, keepdims=True) / self.num_costs
+        with np.errstate(divide='ignore', invalid='ignore'):
+            others_probs = np.where(slot_probs > 0, guess_probs / slot_probs, 0)
+        # Only 1 of the num_validation slots a question may fill was ruled out
+        slot_factors = (1 - others_probs) / (1 - guess_probs)
+        log_factors = np.zeros_like(self.answer_probs)
+        np.add.at(log_factors, (question_idx, guesses_ids), np.log1p((slot_factors - 1) / self.num_validation))
+
+        joint = self.membership[:, None] * self.answer_probs * np.exp(log_factors)
+        known = self.guesses != -1
+        joint[known] = self.answer_probs[known]
+        self._set_posterior(joint, known)
+
+    def update_after_new_info(self, question_ids: np.ndarray, guesses_ids: np.ndarray):
+        """Update the posterior after learning that questions are in the validation set with these answers"""
+        question_idx = self._question_indices(np.atleast_1d(question_ids))
+        self.guesses[question_idx] = guesses_ids
+        joint = self.membership[:, None] * self.answer_probs
+        joint[question_idx] = 0
+        joint[question_idx, np.atleast_1d(guesses_ids).astype(int)] = 1
+        self._set_posterior(joint, self.guesses != -1)
+
+    def _set_posterior(self, joint: np.ndarray, known: np.ndarray):
+        """Split the (question, answer) mass into membership and answer_probs, normalized"""
+        membership = joint.sum(axis=1)
+        self.answer_probs = joint / np.where(membership > 0, membership, 1)[:, None]
+        self.answer_probs[membership == 0] = 1 / self.num_capitals
+        # Known questions are certain, the rest share the remaining validation slots
+        membership[known] = 1
+        unknown_mass = membership[~known].sum()
+        if unknown_mass > 0:
+            membership[~known] *= (self.num_validation - np.count_nonzero(known)) / unknown_mass
+        self.membership = np.clip(membership, 0, 1)
+        self.probs = self.membership / self.membership.sum()
+
+    def _question_indices(self, question_ids: np.ndarray) -> np.ndarray:
+        """Positions in test_countries_ids of the question ids make_guesses returns"""
+        question_ids = np.asarray(question_ids)
+        positions = np.searchsorted(self.test_countries_ids, question_ids, sorter=self._sorter)
+        indices = self._sorter[np.minimum(positions, self.num_test - 1)]
+        unknown = np.asarray(self.test_countries_ids)[indices] != question_ids
+        if np.any(unknown):
+            raise ValueError(f"Question ids {np.unique(question_ids[unknown]).tolist()} are not in the test")
+        return indices
     
     def check_if_correct(self, question_ids: list[int], guesses_ids: list[int]) -> bool:
         # print(question_ids, guesses_ids)
@@ -70,6 +139,11 @@ class AutomatedGuesser:
         
         return True
 
+    def check_guesses(self, question_ids: np.ndarray, guesses_ids: np.ndarray) -> np.ndarray:
+        """Check a batch of guesses from make_guesses, True for every row that is fully correct"""
+        correct_questions = np.all(question_ids == self.validation_countries_ids, axis=1)
+        return correct_questions & np.all(guesses_ids == self.answers_ids, axis=1)
+
 def test_automated_guesser():
     from capitals_gt import country_capitals as COUNTRY_CAPITALS
     
@@ -95,15 +169,15 @@ def test_automated_guesser():
     question_idx, guess_idx = validation_countries_ids[0], validation_answers_ids[0]
     guesser.update_after_new_info(question_idx, guess_idx)
     while guess_count < max_guesses:
-        question_ids, answers_ids = guesser.make_guess()
-        guess_count += 1
-        
-        if guesser.check_if_correct(question_ids, answers_ids):
+        question_ids, answers_ids = guesser.make_guesses(min(GUESS_BATCH, max_guesses - guess_count))
+        correct = np.flatnonzero(guesser.check_guesses(question_ids, answers_ids))
+        if len(correct):
+            guess_count += correct[0] + 1
             print(f"Found correct validation set after {guess_count} guesses!")
             break
-        
+        guesser.update_after_wrong_guess(question_ids, answers_ids)
+        guess_count += len(question_ids)
 
-    
     if guess_count == max_guesses:
         print(f"Did not find correct validation set after {max_guesses} guesses")
 
@@ -0,0 +1,120 @@
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import List, Dict, Iterator, Optional, Tuple, TextIO
+
+from solver import CHECKPOINT_DIR_ENV, SEARCH_ORDERINGS, SearchTimeout, set_checkpoint_dir, solve_job
+
+# Jobs read ahead of the pool per worker, enough to keep it busy without loading the whole file
+JOBS_PER_WORKER = 2
+# Per-job deadline in seconds, a job past it reports how much of its space it covered
+JOB_TIMEOUT = 60.0
+
+
+def read_jobs(lines: TextIO) -> Iterator[Tuple[int, str]]:
+    """Yield (line number, line) for every non-blank line of a JSONL file"""
+    for line_number, line in enumerate(lines, 1):
+        if line.strip():
+            yield line_number, line
+
+def run_job(line_number: int, line: str, timeout: float, ordering: str = 'size') -> Dict:
+    """Solve one JSONL job inside a pool worker and describe the outcome as a JSON-ready result
+
+    The status is 'found', 'not_found' when the whole space was searched, 'timeout' when the
+    deadline came first, or 'error' for jobs that cannot be read or solved.
+    """
+    started_at = time.monotonic()
+    job_id = line_number
+    try:
+        job = json.loads(line)
+        job_id = job.get('id', line_number)
+        validation_set, last_attempts, cost = solve_job(job, ordering=ordering, deadline=timeout)
+    except Exception as e:
+        return {'id': job_id, 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+
+    result = {'id': job_id, 'seconds': time.monotonic() - started_at}
+    if isinstance(cost, SearchTimeout):
+        result.update({
+            'status': 'timeout',
+            'hashes': cost.hashes,
+            'fraction': cost.fraction,
+        })
+    elif validation_set:
+        result.update({
+            'status': 'found',
+            'validation_set': validation_set,
+            'cost': cost,
+            'last_attempts': last_attempts,
+        })
+    else:
+        result['status'] = 'not_found'
+    return result
+
+def run_batch(
+    jobs: Iterator[Tuple[int, str]],
+    output: TextIO,
+    workers: int = 1,
+    timeout: float = JOB_TIMEOUT,
+    ordering: str = 'size'
+) -> Dict[str, int]:
+    """Solve jobs on a process pool, writing every result line as soon as its job finishes
+
+    At most JOBS_PER_WORKER jobs per worker are pending at a time, so arbitrarily long
+    files are streamed. Results come out in completion order, matched to jobs by id.
+    """
+    counts = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for line_number, line in jobs:
+            if len(pending) >= workers * JOBS_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _write_results(done, output, counts)
+            pending.add(executor.submit(run_job, line_number, line, timeout, ordering))
+        _write_results(as_completed(pending), output, counts)
+    return counts
+
+def _write_results(futures, output: TextIO, counts: Dict[str, int]):
+    for future in futures:
+        result = future.result()
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+        output.write(json.dumps(result, ensure_ascii=False) + '\n')
+        output.flush()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Solve a JSONL file of submissions on a process pool")
+    parser.add_argument(
+        'jobs',
+        help="JSONL file, one job per line with groups, k, target_hash, cost_of_mistake, "
+             "optional canonical_order and id, - for stdin"
+    )
+    parser.add_argument('-o', '--output', default='-', help="JSONL file for the results, - for stdout")
+    parser.add_argument('--workers', type=int, default=1, help="jobs solved at the same time")
+    parser.add_argument('--timeout', type=float, default=JOB_TIMEOUT, help="seconds per job")
+    parser.add_argument('--ordering', choices=sorted(SEARCH_ORDERINGS), default='size')
+    parser.add_argument(
+        '--checkpoint-dir', help=f"where checkpoints and exhausted searches are kept, default ${CHECKPOINT_DIR_ENV}"
+    )
+    args = parser.parse_args(argv)
+
+    if args.checkpoint_dir is not None:
+        set_checkpoint_dir(args.checkpoint_dir)
+    jobs_file = sys.stdin if args.jobs == '-' else open(args.jobs)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    started_at = time.monotonic()
+    try:
+        counts = run_batch(read_jobs(jobs_file), output, args.workers, args.timeout, args.ordering)
+    finally:
+        if jobs_file is not sys.stdin:
+            jobs_file.close()
+        if output is not sys.stdout:
+            output.close()
+
+    summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"{sum(counts.values())} jobs in {time.monotonic() - started_at:.1f}s: {summary}", file=sys.stderr)
+    return 1 if counts.get('error') else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
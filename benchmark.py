@@ -0,0 +1,341 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import math
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional
+
+from capitals_gt import country_capitals as COUNTRY_CAPITALS
+from task_generator import generate_quiz
+import solver
+from solver import SEARCH_ORDERINGS, search_validation_set, sum_over_k_subsets, validation_message
+from solver_profile import SolverProfile
+
+# Parameter grids: every combination is a case, unless its search space exceeds max_space
+GRIDS = {
+    'quick': {
+        'groups': [6, 8],
+        'validation_size': [2, 3],
+        'questions_per_group': [2],
+        'width': [2, 3],
+        'cost_of_mistake': [10],
+        'canonical_order': [False, True],
+        'max_space': 5 * 10 ** 6,
+    },
+    'full': {
+        'groups': [4, 6, 8, 10],
+        'validation_size': [2, 3, 4],
+        'questions_per_group': [2, 3],
+        'width': [1, 2, 3],
+        'cost_of_mistake': [0, 10, 50],
+        'canonical_order': [False, True],
+        'max_space': 2 * 10 ** 7,
+    },
+    # Answers clicked in order of confidence, for compare_orderings
+    'clicks': {
+        'groups': [6, 8],
+        'validation_size': [3],
+        'questions_per_group': [2],
+        'width': [2, 3],
+        'cost_of_mistake': [10],
+        'first_click_right': [0.5],
+        'max_space': 5 * 10 ** 6,
+    },
+}
+BASELINE_PATH = 'benchmark_baseline.json'
+# Relative slowdown of a metric over the baseline that counts as a regression
+TOLERANCE = 0.2
+# Timings closer than this to the baseline are noise, whatever the relative change
+NOISE_SECONDS = 0.01
+
+
+def case_name(case: Dict) -> str:
+    name = 'g{groups}-k{validation_size}-q{questions_per_group}-w{width}-c{cost_of_mistake}'.format(**case)
+    if 'first_click_right' in case:
+        name += '-p{first_click_right}'.format(**case)
+    return name + '-canonical' if case.get('canonical_order') else name
+
+def search_space_size(case: Dict) -> int:
+    """Candidates in the whole space when every question has width selected capitals"""
+    k = case['validation_size']
+    group_size = case['width'] ** case['questions_per_group']
+    num_perms = 1 if case.get('canonical_order') else math.factorial(k)
+    return math.comb(case['groups'], k) * num_perms * group_size ** k * (case['cost_of_mistake'] + 1)
+
+def grid_cases(grid: str) -> List[Dict]:
+    params = dict(GRIDS[grid])
+    max_space = params.pop('max_space')
+    cases = [dict(zip(params, values)) for values in itertools.product(*params.values())]
+    return [
+        case for case in cases
+        if case['validation_size'] <= case['groups'] and search_space_size(case) <= max_space
+    ]
+
+def prepare_case(case: Dict, seed: int) -> Dict:
+    """Generate the case's quiz and answers, seeded so every run sees the same data
+
+    Each question gets width selected capitals, one of them correct, so the search always matches.
+    With first_click_right the capitals are in click order, the correct one first with that
+    probability and at a random later click otherwise. Returns the solver's inputs: the
+    group_variants, k, target_hash, cost_of_mistake and canonical_order.
+    """
+    canonical_order = case.get('canonical_order', False)
+    random.seed(seed)
+    # generate_quiz prints the answer, keep it out of the benchmark output
+    with contextlib.redirect_stdout(io.StringIO()):
+        questions, validation_set = generate_quiz(
+            case['groups'], case['validation_size'], case['questions_per_group'], canonical_order
+        )
+    cost = str(random.randint(0, case['cost_of_mistake']))
+    target_hash = hashlib.sha256(validation_message(validation_set, cost).encode()).hexdigest()
+
+    groups = {}
+    for q in questions:
+        correct = COUNTRY_CAPITALS[q['country']]
+        wrong = [capital for capital in q['capitals'] if capital != correct]
+        selected = {correct, *random.sample(wrong, case['width'] - 1)}
+        capitals = [capital for capital in q['capitals'] if capital in selected]
+        if 'first_click_right' in case:
+            capitals = random.sample(sorted(selected - {correct}), case['width'] - 1)
+            if random.random() < case['first_click_right'] or not capitals:
+                capitals.insert(0, correct)
+            else:
+                capitals.insert(random.randint(1, len(capitals)), correct)
+        groups.setdefault(q['group'], []).append((q['country'], capitals))
+    return {
+        'group_variants': [groups[group] for group in sorted(groups)],
+        'k': case['validation_size'],
+        'target_hash': target_hash,
+        'cost_of_mistake': case['cost_of_mistake'],
+        'canonical_order': canonical_order,
+    }
+
+def count_complexity(quiz: Dict) -> int:
+    """Expected hashes of a search of the quiz, as answer_guesser.count_complexity counts them"""
+    num_perms = 1 if quiz['canonical_order'] else math.factorial(quiz['k'])
+    return sum_over_k_subsets(quiz['group_variants'], quiz['k']) * (quiz['cost_of_mistake'] + 1) * num_perms // 2
+
+def search_quiz(
+    quiz: Dict,
+    workers: Optional[int] = None,
+    profile: Optional[SolverProfile] = None,
+    ordering: str = 'size'
+):
+    """Run solver.search_validation_set on a quiz from prepare_case"""
+    return search_validation_set(
+        quiz['group_variants'],
+        quiz['k'],
+        quiz['target_hash'],
+        quiz['cost_of_mistake'],
+        workers,
+        profile,
+        ordering,
+        quiz['canonical_order']
+    )
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """Peak resident memory of this process, or with RUSAGE_CHILDREN of its largest finished child
+
+    ru_maxrss is in KiB on Linux and in bytes on macOS.
+    """
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+@contextlib.contextmanager
+def scratch_checkpoints():
+    """Point the solver's checkpoints at a temporary directory, so runs neither resume nor leave any"""
+    checkpoint_dir = solver.CHECKPOINT_DIR
+    with tempfile.TemporaryDirectory(prefix='benchmark-checkpoints-') as scratch_dir:
+        solver.CHECKPOINT_DIR = scratch_dir
+        try:
+            yield scratch_dir
+        finally:
+            solver.CHECKPOINT_DIR = checkpoint_dir
+
+def run_case(case: Dict, seed: int, repeat: int = 3, workers: int = 1, ordering: str = 'size') -> Dict:
+    """Time count_complexity and the search on one case, keeping the best of repeat runs"""
+    quiz = prepare_case(case, seed)
+
+    complexity_seconds = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        expected_hashes = count_complexity(quiz)
+        complexity_seconds = min(complexity_seconds, time.perf_counter() - start)
+
+    search_seconds = math.inf
+    with scratch_checkpoints():
+        for _ in range(repeat):
+            profile = SolverProfile(detailed=False)
+            start = time.perf_counter()
+            validation_set, _, _ = search_quiz(quiz, workers, profile, ordering)
+            search_seconds = min(search_seconds, time.perf_counter() - start)
+    hashes = profile.counters['hashes']
+
+    return {
+        **case,
+        'seed': seed,
+        'found': bool(validation_set),
+        'expected_hashes': expected_hashes,
+        'hashes': hashes,
+        'complexity_seconds': complexity_seconds,
+        'search_seconds': search_seconds,
+        'hashes_per_second': hashes / search_seconds if search_seconds > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+        # Pool workers of a search with workers > 1 are children, reaped once the pool shuts down
+        'workers_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+def run_suite(
+    grid: str = 'quick',
+    seed: int = 0,
+    repeat: int = 3,
+    workers: int = 1,
+    ordering: str = 'size'
+) -> Dict:
+    """Run every case of the grid in a fresh process, so peak memory is measured per case"""
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for case in grid_cases(grid):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_case, case, seed, repeat, workers, ordering).result()
+        results[case_name(case)] = result
+        print(
+            f"{case_name(case):<22} {result['search_seconds']:8.3f}s "
+            f"{result['hashes']:>12,} hashes {result['hashes_per_second'] or 0:>12,.0f} hashes/sec "
+            f"{result['peak_rss_mb']:7.1f} MB {result['workers_peak_rss_mb']:7.1f} MB in workers"
+        )
+    return {
+        'grid': grid,
+        'seed': seed,
+        'repeat': repeat,
+        'workers': workers,
+        'ordering': ordering,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cases': results,
+    }
+
+def compare_orderings(grid: str = 'clicks', seed: int = 0, trials: int = 20) -> Dict[str, Dict[str, float]]:
+    """Mean hashes before the match per search ordering, over trials seeded quizzes per case"""
+    results = {}
+    for case in grid_cases(grid):
+        hashes = {ordering: [] for ordering in SEARCH_ORDERINGS}
+        for trial in range(trials):
+            quiz = prepare_case(case, seed + trial)
+            for ordering in SEARCH_ORDERINGS:
+                profile = SolverProfile(detailed=False)
+                with scratch_checkpoints():
+                    validation_set, _, _ = search_quiz(quiz, 1, profile, ordering)
+                assert validation_set
+                hashes[ordering].append(profile.counters['hashes'])
+        results[case_name(case)] = {ordering: sum(counts) / trials for ordering, counts in hashes.items()}
+        print(f"{case_name(case):<26} " + ' '.join(
+            f"{ordering} {mean:>12,.0f}" for ordering, mean in results[case_name(case)].items()
+        ) + f" {1 - results[case_name(case)]['confidence'] / results[case_name(case)]['size']:6.1%} fewer")
+    return results
+
+def find_regressions(results: Dict, baseline: Dict, tolerance: float = TOLERANCE) -> List[str]:
+    """Describe every case metric that got worse than the baseline by more than tolerance"""
+    regressions = []
+    for name, result in results['cases'].items():
+        previous = baseline['cases'].get(name)
+        if previous is None:
+            continue
+        if previous['found'] and not result['found']:
+            regressions.append(f"{name}: validation set no longer found")
+        for metric in ['search_seconds', 'complexity_seconds', 'hashes', 'peak_rss_mb', 'workers_peak_rss_mb']:
+            # Baselines from before a metric was recorded have nothing to compare it to
+            if metric not in previous:
+                continue
+            if metric.endswith('_seconds') and result[metric] - previous[metric] < NOISE_SECONDS:
+                continue
+            if result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {previous[metric]:.4g} -> {result[metric]:.4g}")
+        if result['search_seconds'] - previous['search_seconds'] < NOISE_SECONDS:
+            continue
+        if previous['hashes_per_second'] and result['hashes_per_second'] is not None:
+            if result['hashes_per_second'] < previous['hashes_per_second'] * (1 - tolerance):
+                regressions.append(
+                    f"{name}: hashes_per_second "
+                    f"{previous['hashes_per_second']:,.0f} -> {result['hashes_per_second']:,.0f}"
+                )
+    return regressions
+
+
+def pytest_generate_tests(metafunc):
+    """Run the pytest-benchmark entry points below over the quick grid"""
+    if 'case' in metafunc.fixturenames:
+        cases = grid_cases('quick')
+        metafunc.parametrize('case', cases, ids=[case_name(case) for case in cases])
+
+def test_search_validation_set(benchmark, case):
+    """pytest benchmark.py --benchmark-only"""
+    quiz = prepare_case(case, seed=0)
+    profile = SolverProfile(detailed=False)
+    with scratch_checkpoints():
+        search_quiz(quiz, profile=profile)
+        benchmark.extra_info['hashes'] = profile.counters['hashes']
+        validation_set, _, _ = benchmark(search_quiz, quiz)
+    assert validation_set
+
+def test_count_complexity(benchmark, case):
+    quiz = prepare_case(case, seed=0)
+    assert benchmark(count_complexity, quiz) > 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Seeded benchmark of quiz search")
+    parser.add_argument('--grid', choices=sorted(GRIDS), default='quick')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case, the fastest is kept")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--ordering', choices=sorted(SEARCH_ORDERINGS), default='size')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="JSON baseline to compare against")
+    parser.add_argument('--save', action='store_true', help="write the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument(
+        '--compare-orderings', type=int, metavar='TRIALS',
+        help="instead of timing, report mean hashes before the match per ordering over TRIALS quizzes "
+             "of the clicks grid"
+    )
+    args = parser.parse_args(argv)
+
+    if args.compare_orderings:
+        compare_orderings('clicks', args.seed, args.compare_orderings)
+        return 0
+
+    results = run_suite(args.grid, args.seed, args.repeat, args.workers, args.ordering)
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}, run with --save to create one")
+        return 0
+    recorded = (baseline['grid'], baseline['seed'], baseline['workers'], baseline.get('ordering', 'size'))
+    if recorded != (args.grid, args.seed, args.workers, args.ordering):
+        print("Baseline was recorded with a different grid, seed, worker count or ordering")
+    regressions = find_regressions(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regressions against the baseline")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -195,3 +195,8 @@ country_capitals = {
     "Zambia": "Lusaka",
     "Zimbabwe": "Harare"
 }
+
+
+# Integer-indexed tables built once at import, capitals are unique so country i has capital i
+COUNTRIES = tuple(country_capitals)
+CAPITALS = tuple(country_capitals.values())
@@ -0,0 +1,417 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from typing import List, Tuple, Optional, Dict, Set, Union
+
+from solver import (
+    CHECKPOINT_DIR_ENV,
+    PROGRESS_SECONDS,
+    AllCombinationsIterator,
+    SearchSpace,
+    SearchTimeout,
+    get_outside_values,
+    set_checkpoint_dir,
+    solve_job,
+    validation_message,
+)
+
+# Ranges the search space is cut into up front, per local worker
+RANGES_PER_WORKER = 4
+# Ranks left in a range below which it is not split for an idle worker
+MIN_STEAL = 1 << 16
+DEFAULT_PORT = 5577
+# How long local workers get to leave after the stop before they are terminated
+WORKER_EXIT_SECONDS = 5.0
+# Silence after which either side drops a connection, far above PROGRESS_SECONDS. Workers
+# that lose power or the network send no FIN, their ranges are queued again after this.
+CONNECTION_TIMEOUT = 30.0
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _WorkerHandler(socketserver.StreamRequestHandler):
+    """One worker connection: every JSON line it sends gets exactly one JSON line back"""
+    def handle(self):
+        coordinator = self.server.coordinator
+        owned = set()
+        self.connection.settimeout(CONNECTION_TIMEOUT)
+        try:
+            for line in self.rfile:
+                reply = coordinator.handle(json.loads(line), owned)
+                self.wfile.write((json.dumps(reply, ensure_ascii=False) + '\n').encode())
+        except (OSError, ValueError, KeyError):
+            pass
+        finally:
+            coordinator.release(owned)
+
+
+class Coordinator:
+    """Hands out contiguous SearchSpace rank ranges to workers connecting over TCP
+
+    Workers send newline-delimited JSON messages and get one reply each:
+    hello -> job (quiz data), request -> range {id, start, end}, wait or stop,
+    progress {id, position, hashes} -> continue {end} or stop, done {id, hashes} -> ok,
+    found {id, validation_set, cost, hashes} -> stop.
+    A request with nothing left to hand out steals the second half of the range with the
+    most ranks left, its worker learns the shorter end from its next progress reply.
+    The first match or stop() turns every later reply into stop. A match whose hash does not
+    check out only stops its worker and queues its range again. Ranges of a connection that
+    drops or stays silent for CONNECTION_TIMEOUT are queued again from the position it last
+    reported.
+    """
+    def __init__(
+        self,
+        initial_data: List[List[Tuple[str, List[str]]]],
+        k: int,
+        target_hash: str,
+        cost_of_mistake: int,
+        canonical_order: bool = False,
+        address: Tuple[str, int] = ('127.0.0.1', 0),
+        ranges: Optional[List[Tuple[int, int]]] = None,
+        parts: int = RANGES_PER_WORKER
+    ):
+        self.initial_data = initial_data
+        self.target_hash = target_hash
+        self.space = SearchSpace(
+            [[len(options) for _, options in task] for task in initial_data], k, cost_of_mistake, canonical_order
+        )
+        self.job = {
+            'type': 'job',
+            'groups': initial_data,
+            'k': k,
+            'target_hash': target_hash,
+            'cost_of_mistake': cost_of_mistake,
+            'canonical_order': canonical_order,
+        }
+        if ranges is None:
+            ranges = self.space.split(parts)
+        self.pending = deque((start, end) for start, end in ranges if start < end)
+        # Range id -> {'start', 'end', 'position', 'hashes'} of every range a worker is on
+        self.assigned = {}
+        self.next_id = 0
+        self.done_hashes = 0
+        self.result = None
+        self.stopped = False
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        if not self.pending:
+            self._finish([], [], 0)
+
+        self.server = _Server(address, _WorkerHandler)
+        self.server.coordinator = self
+        self.address = self.server.server_address[:2]
+        self.started_at = time.monotonic()
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        """Tell every worker to stop at its next message"""
+        with self.lock:
+            self.stopped = True
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def hashes(self) -> int:
+        with self.lock:
+            return self.done_hashes + sum(state['hashes'] for state in self.assigned.values())
+
+    def remaining_ranges(self) -> List[Tuple[int, int]]:
+        """Ranges not hashed yet, as far as workers reported, accepted back as ranges"""
+        with self.lock:
+            return list(self.pending) + [
+                (max(state['start'], state['position']), state['end'])
+                for state in self.assigned.values()
+            ]
+
+    def _finish(self, validation_set, outside_values, cost):
+        self.result = validation_set, outside_values, cost
+        self.stopped = True
+        self.finished.set()
+
+    def _assign(self, start: int, end: int, owned: Set[int]) -> Dict:
+        range_id = self.next_id
+        self.next_id += 1
+        self.assigned[range_id] = {'start': start, 'end': end, 'position': start, 'hashes': 0}
+        owned.add(range_id)
+        return {'type': 'range', 'id': range_id, 'start': start, 'end': end}
+
+    def _steal(self, owned: Set[int]) -> Optional[Dict]:
+        if not self.assigned:
+            return None
+        victim = max(self.assigned.values(), key=lambda state: state['end'] - max(state['start'], state['position']))
+        position = max(victim['start'], victim['position'])
+        if victim['end'] - position < 2 * MIN_STEAL:
+            return None
+        middle = position + (victim['end'] - position) // 2
+        end, victim['end'] = victim['end'], middle
+        return self._assign(middle, end, owned)
+
+    def handle(self, message: Dict, owned: Set[int]) -> Dict:
+        with self.lock:
+            kind = message['type']
+            if kind == 'hello':
+                return self.job
+            if kind == 'progress':
+                state = self.assigned.get(message['id'])
+                if state is None or self.stopped:
+                    return {'type': 'stop'}
+                state['position'] = message['position']
+                state['hashes'] = message['hashes']
+                return {'type': 'continue', 'end': state['end']}
+            if kind == 'done':
+                state = self.assigned.pop(message['id'], None)
+                owned.discard(message['id'])
+                if state is not None:
+                    self.done_hashes += message['hashes']
+                if not self.pending and not self.assigned and self.result is None:
+                    self._finish([], [], 0)
+                return {'type': 'ok'}
+            if kind == 'found':
+                state = self.assigned.pop(message['id'], None)
+                owned.discard(message['id'])
+                verified = self._verify(message)
+                if verified is None:
+                    # Wrong or forged match: the range is still unsearched as far as we know
+                    if state is not None:
+                        self._requeue(state)
+                    return {'type': 'stop'}
+                validation_set, cost = verified
+                self.done_hashes += message['hashes']
+                if self.result is None:
+                    self._finish(validation_set, get_outside_values(self.initial_data, validation_set), cost)
+                return {'type': 'stop'}
+            if kind == 'request':
+                if self.stopped:
+                    return {'type': 'stop'}
+                if self.pending:
+                    return self._assign(*self.pending.popleft(), owned)
+                stolen = self._steal(owned)
+                if stolen is not None:
+                    return stolen
+                return {'type': 'wait'}
+            raise ValueError(f"Unknown message type: {kind}")
+
+    def _verify(self, message: Dict) -> Optional[Tuple[List[Tuple[str, str]], int]]:
+        """The validation set and cost of a found message if they hash to the target, else None"""
+        try:
+            validation_set = [(str(country), str(capital)) for country, capital in message['validation_set']]
+            cost = int(message['cost'])
+        except (TypeError, ValueError):
+            return None
+        digest = hashlib.sha256(validation_message(validation_set, cost).encode()).hexdigest()
+        return (validation_set, cost) if digest == self.target_hash else None
+
+    def _requeue(self, state: Dict):
+        self.done_hashes += state['hashes']
+        start = max(state['start'], state['position'])
+        if start < state['end']:
+            self.pending.append((start, state['end']))
+
+    def release(self, owned: Set[int]):
+        """Queue the unfinished part of the ranges of a connection that went away"""
+        with self.lock:
+            for range_id in owned:
+                state = self.assigned.pop(range_id, None)
+                if state is not None:
+                    self._requeue(state)
+
+
+def run_worker(address: Tuple[str, int]) -> int:
+    """Search the ranges a coordinator hands out until it says stop, and return the hashes computed
+
+    Losing the connection ends the worker like a stop does.
+    """
+    hashes = 0
+    with socket.create_connection(address) as connection:
+        connection.settimeout(CONNECTION_TIMEOUT)
+        stream = connection.makefile('rw', encoding='utf-8')
+
+        def call(message: Dict) -> Dict:
+            stream.write(json.dumps(message, ensure_ascii=False) + '\n')
+            stream.flush()
+            line = stream.readline()
+            if not line:
+                raise ConnectionError("Coordinator closed the connection")
+            return json.loads(line)
+
+        try:
+            job = call({'type': 'hello'})
+            initial_data = [[(country, capitals) for country, capitals in group] for group in job['groups']]
+            while True:
+                reply = call({'type': 'request'})
+                if reply['type'] == 'stop':
+                    return hashes
+                if reply['type'] == 'wait':
+                    time.sleep(PROGRESS_SECONDS)
+                    continue
+
+                range_id = reply['id']
+                stop = False
+                last_report = time.monotonic()
+
+                def report_progress(iterator: AllCombinationsIterator):
+                    nonlocal stop, last_report
+                    if time.monotonic() - last_report < PROGRESS_SECONDS:
+                        return
+                    answer = call({
+                        'type': 'progress',
+                        'id': range_id,
+                        'position': iterator.position,
+                        'hashes': iterator.hashes_computed,
+                    })
+                    if answer['type'] == 'stop':
+                        stop = True
+                    else:
+                        # Part of the range may have been handed to an idle worker
+                        iterator.rank_end = answer['end']
+                    last_report = time.monotonic()
+
+                combinator = AllCombinationsIterator(
+                    initial_data,
+                    job['k'],
+                    job['target_hash'],
+                    job['cost_of_mistake'],
+                    should_stop=lambda: stop,
+                    rank_range=(reply['start'], reply['end']),
+                    on_progress=report_progress,
+                    canonical_order=job['canonical_order']
+                )
+                validation_set, _, cost = next(combinator)
+                hashes += combinator.hashes_computed
+                if validation_set:
+                    call({
+                        'type': 'found',
+                        'id': range_id,
+                        'validation_set': validation_set,
+                        'cost': cost,
+                        'hashes': combinator.hashes_computed,
+                    })
+                    return hashes
+                if stop:
+                    return hashes
+                call({'type': 'done', 'id': range_id, 'hashes': combinator.hashes_computed})
+        except (ConnectionError, TimeoutError):
+            # The coordinator went away, nobody is left to report to
+            return hashes
+
+def cluster_search(
+    initial_data: List[List[Tuple[str, List[str]]]],
+    k: int,
+    target_hash: str,
+    cost_of_mistake: int,
+    workers: int = 1,
+    address: Tuple[str, int] = ('127.0.0.1', 0),
+    canonical_order: bool = False,
+    deadline: Optional[float] = None,
+    ranges: Optional[List[Tuple[int, int]]] = None
+) -> Tuple[Optional[List[Tuple[str, str]]], List[Tuple[str, str]], Union[int, SearchTimeout]]:
+    """Coordinate a search on address with workers local worker processes
+
+    Workers on other hosts join with `python cluster.py worker HOST PORT`. Returns the usual
+    triple, or after deadline seconds None, random last attempts and a SearchTimeout whose
+    checkpoint lists the ranges left, to be passed back as ranges.
+    """
+    coordinator = Coordinator(
+        initial_data, k, target_hash, cost_of_mistake, canonical_order, address, ranges,
+        max(workers, 1) * RANGES_PER_WORKER
+    )
+    coordinator.start()
+    host, port = coordinator.address
+    # Local workers reach a coordinator listening on every interface through loopback
+    local_address = ('127.0.0.1' if host in ('', '0.0.0.0') else host, port)
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(local_address,), daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        coordinator.finished.wait(deadline)
+    finally:
+        coordinator.stop()
+        for process in processes:
+            process.join(WORKER_EXIT_SECONDS)
+            if process.is_alive():
+                process.terminate()
+        coordinator.close()
+
+    if coordinator.result is not None:
+        return coordinator.result
+    remaining = coordinator.remaining_ranges()
+    return None, get_outside_values(initial_data, []), SearchTimeout(
+        coordinator.hashes,
+        coordinator.space.size,
+        time.monotonic() - coordinator.started_at,
+        {'ranges': remaining}
+    )
+
+def _join_coordinator(address: Tuple[str, int]):
+    try:
+        run_worker(address)
+    except OSError as e:
+        print(f"Cannot reach the coordinator at {address[0]}:{address[1]}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Search one set of answers across several hosts")
+    commands = parser.add_subparsers(dest='command', required=True)
+    coordinate = commands.add_parser('coordinate', help="serve a JSON job to workers and print the result")
+    coordinate.add_argument('job', help="JSON file with groups, k, target_hash, cost_of_mistake and canonical_order")
+    coordinate.add_argument('--host', default='0.0.0.0')
+    coordinate.add_argument('--port', type=int, default=DEFAULT_PORT)
+    coordinate.add_argument('--workers', type=int, default=0, help="worker processes on this host")
+    coordinate.add_argument('--deadline', type=float, default=None, help="seconds before giving up")
+    coordinate.add_argument(
+        '--checkpoint-dir', help=f"where exhausted searches are recorded, default ${CHECKPOINT_DIR_ENV}"
+    )
+    worker = commands.add_parser('worker', help="join a coordinator")
+    worker.add_argument('host')
+    worker.add_argument('--port', type=int, default=DEFAULT_PORT)
+    worker.add_argument('--processes', type=int, default=1, help="worker processes to start on this host")
+    args = parser.parse_args(argv)
+
+    if args.command == 'worker':
+        address = (args.host, args.port)
+        processes = [multiprocessing.Process(target=_join_coordinator, args=(address,)) for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return 0 if all(process.exitcode == 0 for process in processes) else 1
+
+    if args.checkpoint_dir is not None:
+        set_checkpoint_dir(args.checkpoint_dir)
+    with open(args.job) as f:
+        job = json.load(f)
+    validation_set, last_attempts, cost = solve_job(
+        job, workers=args.workers, listen=(args.host, args.port), deadline=args.deadline
+    )
+    if validation_set is None:
+        print(f"Stopped after {cost.elapsed:.1f}s with {cost.fraction:.1%} of candidates tried")
+        print(json.dumps(cost.checkpoint))
+        return 2
+    if not validation_set:
+        print("No matching validation set found!")
+        return 1
+    print(f"Found validation set with cost {cost}:")
+    for country, capital in validation_set:
+        print(f"{country}\t{capital}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
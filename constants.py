@@ -4,6 +4,10 @@ NUM_QUESTIONS = 10
 QUESTIONS_PER_GROUP = 3
 VALIDATION_SIZE = 5
 COST_OF_MISTAKE = 10
+# Longest expected search time in seconds a submission may start, and whether a longer
+# one is only warned about ('warn') or not started at all ('refuse')
+SEARCH_TIME_BUDGET = 600.0
+SEARCH_BUDGET_POLICY = 'warn'
 
 
 def update_parameters(num_questions: int, validation_size: int, questions_per_group: int = None, cost_of_mistake: int = None):
@@ -18,4 +22,15 @@ def update_parameters(num_questions: int, validation_size: int, questions_per_gr
 
 def get_parameters():
     """Get current parameters"""
-    return NUM_QUESTIONS, VALIDATION_SIZE, QUESTIONS_PER_GROUP, COST_OF_MISTAKE 
\ No newline at end of file
+    return NUM_QUESTIONS, VALIDATION_SIZE, QUESTIONS_PER_GROUP, COST_OF_MISTAKE 
+
+def update_search_budget(time_budget: float, policy: str = None):
+    """Update the search time budget"""
+    global SEARCH_TIME_BUDGET, SEARCH_BUDGET_POLICY
+    SEARCH_TIME_BUDGET = time_budget
+    if policy is not None:
+        SEARCH_BUDGET_POLICY = policy
+
+def get_search_budget():
+    """Get current search time budget and policy"""
+    return SEARCH_TIME_BUDGET, SEARCH_BUDGET_POLICY
@@ -0,0 +1,130 @@
+import hashlib
+import time
+import numpy as np
+from typing import List, Dict, Tuple
+
+K = np.array([
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+], dtype=np.uint32)
+
+H0 = np.array([
+    0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+], dtype=np.uint32)
+
+
+def _rotr(x: np.ndarray, n: int) -> np.ndarray:
+    return (x >> np.uint32(n)) | (x << np.uint32(32 - n))
+
+def _pad_messages(messages: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pad every message as SHA-256 requires and pack them into a (B, blocks, 16) uint32 array"""
+    lengths = np.fromiter((len(m) for m in messages), dtype=np.int64, count=len(messages))
+    num_blocks = (lengths + 9 + 63) // 64
+    batch = np.zeros((len(messages), int(num_blocks.max()) * 64), dtype=np.uint8)
+
+    rows = np.arange(len(messages))
+    starts = np.cumsum(lengths) - lengths
+    flat = np.frombuffer(b''.join(messages), dtype=np.uint8)
+    message_rows = np.repeat(rows, lengths)
+    message_cols = np.arange(len(flat)) - np.repeat(starts, lengths)
+    batch[message_rows, message_cols] = flat
+    batch[rows, lengths] = 0x80
+
+    bit_lengths = lengths * 8
+    ends = num_blocks * 64
+    for byte in range(8):
+        batch[rows, ends - 8 + byte] = (bit_lengths >> (56 - 8 * byte)) & 0xff
+
+    words = batch.view('>u4').astype(np.uint32)
+    return words.reshape(len(messages), -1, 16), num_blocks
+
+def _compress(state: np.ndarray, block: np.ndarray) -> np.ndarray:
+    """Run the 64 SHA-256 rounds on one block of every message in the batch"""
+    w = np.empty((64, block.shape[0]), dtype=np.uint32)
+    w[:16] = block.T
+    for t in range(16, 64):
+        s0 = _rotr(w[t - 15], 7) ^ _rotr(w[t - 15], 18) ^ (w[t - 15] >> np.uint32(3))
+        s1 = _rotr(w[t - 2], 17) ^ _rotr(w[t - 2], 19) ^ (w[t - 2] >> np.uint32(10))
+        w[t] = w[t - 16] + s0 + w[t - 7] + s1
+
+    a, b, c, d, e, f, g, h = state.T.copy()
+    for t in range(64):
+        s1 = _rotr(e, 6) ^ _rotr(e, 11) ^ _rotr(e, 25)
+        ch = (e & f) ^ (~e & g)
+        temp1 = h + s1 + ch + K[t] + w[t]
+        s0 = _rotr(a, 2) ^ _rotr(a, 13) ^ _rotr(a, 22)
+        maj = (a & b) ^ (a & c) ^ (b & c)
+        temp2 = s0 + maj
+        h, g, f, e, d, c, b, a = g, f, e, d + temp1, c, b, a, temp1 + temp2
+
+    return state + np.stack([a, b, c, d, e, f, g, h], axis=1)
+
+def sha256_batch_words(messages: List[bytes]) -> np.ndarray:
+    """SHA-256 of every message as a (B, 8) array of uint32 digest words"""
+    words, num_blocks = _pad_messages(messages)
+    state = np.tile(H0, (len(messages), 1))
+    for block_idx in range(words.shape[1]):
+        compressed = _compress(state, words[:, block_idx])
+        active = (num_blocks > block_idx)[:, None]
+        state = np.where(active, compressed, state)
+    return state
+
+def sha256_batch(messages: List[bytes]) -> List[bytes]:
+    """SHA-256 digests of every message, identical to hashlib.sha256(m).digest()"""
+    digests = sha256_batch_words(messages).astype('>u4').tobytes()
+    return [digests[i:i + 32] for i in range(0, len(digests), 32)]
+
+
+class HashlibBackend:
+    """Hash candidates one by one with hashlib"""
+    batch_size = 1024
+
+    def find_match(self, messages: List[bytes], target_digest: bytes) -> int:
+        """Index of the first message hashing to target_digest, -1 if there is none"""
+        sha256 = hashlib.sha256
+        for idx, message in enumerate(messages):
+            if sha256(message).digest() == target_digest:
+                return idx
+        return -1
+
+
+class NumpyBackend:
+    """Hash whole batches of candidates with the vectorized SHA-256 above"""
+    def __init__(self, batch_size: int = 16384):
+        self.batch_size = batch_size
+
+    def find_match(self, messages: List[bytes], target_digest: bytes) -> int:
+        """Index of the first message hashing to target_digest, -1 if there is none"""
+        target_words = np.frombuffer(target_digest, dtype='>u4').astype(np.uint32)
+        matches = np.flatnonzero((sha256_batch_words(messages) == target_words).all(axis=1))
+        return int(matches[0]) if len(matches) else -1
+
+
+def compare_backends(num_messages: int = 65536, message_length: int = 120, seed: int = 0) -> Dict[str, float]:
+    """Measure the hashes/sec of both backends on random messages
+
+    The solver does not use either: hashing from cached country midstates with hashlib beats
+    assembling whole messages for a batch, and NumPy trails hashlib on these short messages.
+    """
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(message_length // 2, message_length + 1, size=num_messages)
+    messages = [rng.bytes(int(length)) for length in lengths]
+
+    throughput = {}
+    missing_digest = bytes(32)
+    for name, backend in [('hashlib', HashlibBackend()), ('numpy', NumpyBackend())]:
+        start = time.perf_counter()
+        for i in range(0, num_messages, backend.batch_size):
+            backend.find_match(messages[i:i + backend.batch_size], missing_digest)
+        throughput[name] = num_messages / (time.perf_counter() - start)
+    return throughput
+
+if __name__ == "__main__":
+    for name, hashes_per_second in compare_backends().items():
+        print(f"{name}\t{hashes_per_second:,.0f} hashes/sec")
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 from task_generator import generate_quiz, save_quiz_data
-from constants import get_parameters, update_parameters
+from constants import get_parameters, update_parameters, get_search_budget, update_search_budget
 
 def main():
     st.title("Country-Capital Annotation using DDAP")
@@ -13,6 +13,7 @@ def main():
     if st.session_state.page == 'task_generation':
         
         num_questions, validation_size, questions_per_group, cost_of_mistake = get_parameters()
+        time_budget, budget_policy = get_search_budget()
         
         # Add parameter inputs
         st.markdown("### Quiz Parameters")
@@ -49,16 +50,39 @@ def main():
                 value=cost_of_mistake,
                 help="Maximum cost value for hash verification"
             )
+        canonical_order = st.checkbox(
+            "Canonical Group Order",
+            value=False,
+            help="Hash the validation groups sorted by group number, so the guesser does not have to try every order of them"
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            time_budget = st.number_input(
+                "Search Time Budget (s)",
+                min_value=1.0,
+                value=float(time_budget),
+                help="Longest expected guessing time a submission may start, predicted from this machine's hash rate"
+            )
+        with col2:
+            budget_policy = st.selectbox(
+                "Over Budget",
+                ['warn', 'refuse'],
+                index=['warn', 'refuse'].index(budget_policy),
+                help="Ask before starting a search over the budget, or do not start it at all"
+            )
         
         if st.button("Generate Tasks"):
                 # Update constants with user parameters
                 update_parameters(num_questions, validation_size, questions_per_group, cost_of_mistake)
+                update_search_budget(time_budget, budget_policy)
                 
                 # Generate quiz with user parameters
-                questions, validation_set = generate_quiz(num_questions, validation_size, questions_per_group)
+                questions, validation_set = generate_quiz(
+                    num_questions, validation_size, questions_per_group, canonical_order
+                )
                 
                 # Save quiz data
-                save_quiz_data(questions, validation_set)
+                save_quiz_data(questions, validation_set, canonical_order)
                 
                 # Switch to quiz page
                 st.session_state.page = 'quiz'
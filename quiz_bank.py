@@ -0,0 +1,196 @@
+import argparse
+import hashlib
+import sys
+import time
+from typing import List, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from constants import get_parameters
+from capitals_gt import COUNTRIES, CAPITALS
+from solver import validation_message
+
+# Quizzes generated and written at a time, memory stays flat whatever the total
+CHUNK_SIZE = 10000
+# Capitals offered per question, the correct one among them
+OPTIONS_PER_QUESTION = 4
+
+# Columns of the two tables every chunk is made of
+QUESTION_COLUMNS = ['quiz', 'country', 'capitals', 'group']
+QUIZ_COLUMNS = ['quiz', 'validation_groups', 'cost', 'target_hash', 'canonical_order']
+
+COUNTRY_NAMES = np.array(COUNTRIES, dtype=object)
+CAPITAL_NAMES = np.array(CAPITALS, dtype=object)
+
+
+def sample_quiz_ids(
+    rng: np.random.Generator,
+    n: int,
+    num_questions: int,
+    validation_size: int,
+    questions_per_group: int,
+    canonical_order: bool = False
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sample n quizzes at once as ids: countries, options and validation groups
+
+    Returns country ids (n, questions), capital ids of the options (n, questions, 4) and
+    0-based validation groups (n, validation_size) in the order the hash lists them.
+    Country i has capital i, the options hold it plus three distinct wrong capitals.
+    """
+    num_countries = len(COUNTRIES)
+    questions = num_questions * questions_per_group
+    if questions > num_countries:
+        raise ValueError(f"A quiz of {questions} questions needs more countries than the {num_countries} there are")
+    if validation_size > num_questions:
+        raise ValueError(f"Validation size {validation_size} is larger than the {num_questions} groups")
+    country_ids = np.argsort(rng.random((n, num_countries)), axis=1)[:, :questions]
+
+    # Distinct offsets from 1 to num_countries - 1 never land on the correct capital,
+    # rows that drew an offset twice are drawn again
+    num_wrong = OPTIONS_PER_QUESTION - 1
+    offsets = rng.integers(1, num_countries, size=(n, questions, num_wrong))
+    while True:
+        ordered = np.sort(offsets, axis=2)
+        repeated = np.any(ordered[..., 1:] == ordered[..., :-1], axis=2)
+        if not repeated.any():
+            break
+        offsets[repeated] = rng.integers(1, num_countries, size=(np.count_nonzero(repeated), num_wrong))
+    options = np.concatenate([(country_ids[..., None] + offsets) % num_countries, country_ids[..., None]], axis=2)
+    # Swapping the correct capital into a random slot shuffles the already random distractors
+    slots = rng.integers(OPTIONS_PER_QUESTION, size=(n, questions))
+    rows = np.indices((n, questions))
+    options[rows[0], rows[1], -1] = options[rows[0], rows[1], slots]
+    options[rows[0], rows[1], slots] = country_ids
+
+    validation_groups = np.argsort(rng.random((n, num_questions)), axis=1)[:, :validation_size]
+    if canonical_order:
+        validation_groups.sort(axis=1)
+    return country_ids, options, validation_groups
+
+def generate_quiz_chunks(
+    n: int,
+    num_questions: int = None,
+    validation_size: int = None,
+    questions_per_group: int = None,
+    cost_of_mistake: int = None,
+    canonical_order: bool = False,
+    seed: int = 0,
+    chunk_size: int = CHUNK_SIZE
+) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """Generate n quizzes chunk by chunk, as (questions, quizzes) tables per chunk
+
+    questions has one row per question with quiz, country, capitals and group, like tasks_df
+    with a quiz column. quizzes has one row per quiz with its validation groups, cost and
+    target hash. Chunk i is seeded by (seed, i), the same seed and chunk size give the same
+    quizzes. Parameters default to the current ones.
+    """
+    current_num_questions, current_validation_size, current_questions_per_group, current_cost = get_parameters()
+    num_questions = num_questions or current_num_questions
+    validation_size = validation_size or current_validation_size
+    questions_per_group = questions_per_group or current_questions_per_group
+    cost_of_mistake = current_cost if cost_of_mistake is None else cost_of_mistake
+
+    groups = np.repeat(np.arange(num_questions), questions_per_group)
+    for chunk, start in enumerate(range(0, n, chunk_size)):
+        size = min(chunk_size, n - start)
+        rng = np.random.default_rng([seed, chunk])
+        country_ids, options, validation_groups = sample_quiz_ids(
+            rng, size, num_questions, validation_size, questions_per_group, canonical_order
+        )
+        costs = rng.integers(0, cost_of_mistake + 1, size=size)
+
+        capitals = CAPITAL_NAMES[options[..., 0]]
+        for slot in range(1, OPTIONS_PER_QUESTION):
+            capitals = capitals + '|' + CAPITAL_NAMES[options[..., slot]]
+        questions = pd.DataFrame({
+            'quiz': np.repeat(np.arange(start, start + size), len(groups)),
+            'country': COUNTRY_NAMES[country_ids].ravel(),
+            'capitals': capitals.ravel(),
+            'group': np.tile(groups + 1, size),
+        })
+
+        # Validation questions of every quiz, group by group in hash order
+        positions = (validation_groups[..., None] * questions_per_group + np.arange(questions_per_group)).reshape(size, -1)
+        validation_ids = np.take_along_axis(country_ids, positions, axis=1)
+        target_hashes = [
+            hashlib.sha256(
+                validation_message(list(zip(COUNTRY_NAMES[ids], CAPITAL_NAMES[ids])), cost).encode()
+            ).hexdigest()
+            for ids, cost in zip(validation_ids, costs)
+        ]
+        quizzes = pd.DataFrame({
+            'quiz': np.arange(start, start + size),
+            'validation_groups': ['|'.join(map(str, row + 1)) for row in validation_groups],
+            'cost': costs,
+            'target_hash': target_hashes,
+            'canonical_order': canonical_order,
+        })
+        yield questions, quizzes
+
+def generate_quizzes(n: int, **kwargs) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Generate n quizzes in memory as one (questions, quizzes) pair, see generate_quiz_chunks"""
+    chunks = list(generate_quiz_chunks(n, **kwargs))
+    if not chunks:
+        return pd.DataFrame(columns=QUESTION_COLUMNS), pd.DataFrame(columns=QUIZ_COLUMNS)
+    return (
+        pd.concat([questions for questions, _ in chunks], ignore_index=True),
+        pd.concat([quizzes for _, quizzes in chunks], ignore_index=True),
+    )
+
+def write_quizzes(questions_path: str, quizzes_path: str, n: int, **kwargs) -> int:
+    """Stream n quizzes to two tables chunk by chunk, Parquet for .parquet paths and CSV otherwise"""
+    writers = {}
+    written = 0
+    try:
+        for questions, quizzes in generate_quiz_chunks(n, **kwargs):
+            for path, df in [(questions_path, questions), (quizzes_path, quizzes)]:
+                if path.endswith('.parquet'):
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+                    table = pa.Table.from_pandas(df, preserve_index=False)
+                    if path not in writers:
+                        writers[path] = pq.ParquetWriter(path, table.schema)
+                    writers[path].write_table(table)
+                else:
+                    df.to_csv(path, mode='a' if written else 'w', header=not written, index=False)
+            written += len(quizzes)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    num_questions, validation_size, questions_per_group, cost_of_mistake = get_parameters()
+    parser = argparse.ArgumentParser(description="Generate a seeded pool of quizzes with their target hashes")
+    parser.add_argument('n', type=int, help="quizzes to generate")
+    parser.add_argument('--questions', default='questions.csv', help="question table, .csv or .parquet")
+    parser.add_argument('--quizzes', default='quizzes.csv', help="quiz table, .csv or .parquet")
+    parser.add_argument('--groups', type=int, default=num_questions)
+    parser.add_argument('--validation-size', type=int, default=validation_size)
+    parser.add_argument('--questions-per-group', type=int, default=questions_per_group)
+    parser.add_argument('--cost-of-mistake', type=int, default=cost_of_mistake)
+    parser.add_argument('--canonical-order', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    started_at = time.monotonic()
+    written = write_quizzes(
+        args.questions,
+        args.quizzes,
+        args.n,
+        num_questions=args.groups,
+        validation_size=args.validation_size,
+        questions_per_group=args.questions_per_group,
+        cost_of_mistake=args.cost_of_mistake,
+        canonical_order=args.canonical_order,
+        seed=args.seed,
+        chunk_size=args.chunk_size
+    )
+    print(f"{written} quizzes in {time.monotonic() - started_at:.1f}s", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
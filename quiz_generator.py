@@ -2,12 +2,17 @@ import streamlit as st
 import pandas as pd
 from typing import List, Dict, Tuple
 import random
+import os
 import time
 from datetime import datetime
-from constants import get_parameters
-from answer_guesser import find_validation_set, count_complexity
+from constants import get_parameters, get_search_budget
+from answer_guesser import start_validation_search, finish_validation_search, count_complexity, predict_search
 from capitals_gt import country_capitals as COUNTRY_CAPITALS
 
+SEARCH_WORKERS = os.cpu_count() or 1
+# Capitals clicked first are tried first, see solver.ConfidenceOrderIterator
+SEARCH_ORDERING = 'confidence'
+
 
 def load_tasks() -> pd.DataFrame:
     """Load tasks from session state"""
@@ -20,6 +25,7 @@ def save_answers():
     # Convert answers to DataFrame format
     answers_data = []
     for idx, q in enumerate(st.session_state.quiz):
+        # Selected capitals keep their click order, the guesser tries earlier clicks first
         selected_capitals = st.session_state.selected[idx]
         # If no capitals selected, use all capitals
         if not selected_capitals:
@@ -33,6 +39,13 @@ def save_answers():
     
     st.session_state.answers_df = pd.DataFrame(answers_data)
 
+def format_duration(seconds: float) -> str:
+    """Format a duration in the largest unit that keeps it above one"""
+    for unit, size in [('years', 365 * 24 * 3600), ('days', 24 * 3600), ('hours', 3600), ('minutes', 60)]:
+        if seconds >= size:
+            return f"{seconds / size:.1f} {unit}"
+    return f"{seconds:.1f} seconds"
+
 def get_quiz(tasks_df: pd.DataFrame) -> List[Dict]:
     """Generate quiz questions from tasks dataframe"""
     questions = []
@@ -66,6 +79,8 @@ def show_quiz_interface():
         target_hash = st.session_state.target_hash
         st.markdown("### Target Hash")
         st.code(target_hash, language='text')
+        if st.session_state.get('canonical_order', False):
+            st.caption("Validation groups are hashed in increasing group order.")
         st.markdown("---")
     except:
         st.error("Target hash not found!")
@@ -131,37 +146,89 @@ def show_quiz_interface():
             formatted_complexity = f"{complexity:.2e}"
             base, exponent = formatted_complexity.split("e")
             st.write(f"Expected number of hash computations: {base} e{exponent}")
+            prediction = predict_search(SEARCH_WORKERS, SEARCH_ORDERING)
+            st.write(
+                f"Expected guessing time on this machine: {format_duration(prediction['expected_seconds'])} "
+                f"(at most {format_duration(prediction['worst_case_seconds'])})"
+            )
 
 
     if st.session_state.guessing:
-        # Record submission time
-        submission_time = time.time() - st.session_state.start_time
-        st.session_state.submission_times.append(submission_time)
-        
-        # Prepare answers for saving
-        answers = []
-        for idx, q in enumerate(st.session_state.quiz):
-            selected_capitals = st.session_state.selected[idx]
-            # If no capitals selected, use all capitals
-            if not selected_capitals:
-                selected_capitals = q['capitals']
-            
-            answers.append({
-                'country': q['country'],
-                'capitals': '|'.join(selected_capitals)
-            })
-        
-        save_answers()
-        
-        guess_start_time = time.time()
-        validation_set, outside_validation_tasks, cost = find_validation_set()
-        guess_time = time.time() - guess_start_time
-        st.session_state.guessing_times.append(guess_time)
-        st.session_state.validation_set = validation_set
-        st.session_state.outside_validation_tasks = outside_validation_tasks
-        st.session_state.cost = cost
-        st.session_state.guessing = False
-        st.rerun()
+        if st.session_state.get('search') is None:
+            save_answers()
+
+            # Predict the guessing time before any hashing and hold back searches over the budget
+            time_budget, budget_policy = get_search_budget()
+            prediction = predict_search(SEARCH_WORKERS, SEARCH_ORDERING)
+            over_budget = prediction['expected_seconds'] > time_budget
+            if over_budget and budget_policy == 'refuse':
+                st.session_state.search_refused = prediction
+                st.session_state.guessing = False
+                st.rerun()
+            elif over_budget and not st.session_state.get('budget_override'):
+                st.warning(
+                    f"Guessing these answers is expected to take {format_duration(prediction['expected_seconds'])}, "
+                    f"over the budget of {format_duration(time_budget)}."
+                )
+                col1, col2 = st.columns(2)
+                if col1.button("Search Anyway"):
+                    st.session_state.budget_override = True
+                    st.rerun()
+                if col2.button("Change Answers"):
+                    st.session_state.guessing = False
+                    st.rerun()
+            else:
+                st.session_state.budget_override = False
+
+                # Record submission time
+                submission_time = time.time() - st.session_state.start_time
+                st.session_state.submission_times.append(submission_time)
+
+                st.session_state.guess_start_time = time.time()
+                st.session_state.search = start_validation_search(SEARCH_WORKERS, ordering=SEARCH_ORDERING)
+
+    if st.session_state.guessing and st.session_state.get('search') is not None:
+        search = st.session_state.search
+        progress = search.progress()
+        st.progress(progress.get('fraction', 0.0), text="Searching for the validation set...")
+        eta = f"{progress['eta']:.0f}s" if progress.get('eta') is not None else "unknown"
+        st.write(
+            f"Hashes tried: {progress['hashes']:,} · "
+            f"{progress['hashes_per_second']:,.0f} hashes/sec · ETA: {eta}"
+        )
+        if st.button("Cancel Search", disabled=search.done):
+            search.cancel()
+
+        if search.done:
+            result = finish_validation_search(search)
+            st.session_state.search = None
+            st.session_state.guessing = False
+            if result is None:
+                st.session_state.search_cancelled = True
+                st.session_state.submission_times.pop()
+            else:
+                guess_time = time.time() - st.session_state.guess_start_time
+                st.session_state.guessing_times.append(guess_time)
+                validation_set, outside_validation_tasks, cost = result
+                st.session_state.validation_set = validation_set
+                st.session_state.outside_validation_tasks = outside_validation_tasks
+                st.session_state.cost = cost
+            st.rerun()
+        else:
+            time.sleep(0.5)
+            st.rerun()
+
+    if st.session_state.get('search_refused') is not None:
+        prediction = st.session_state.search_refused
+        st.error(
+            f"Guessing these answers is expected to take {format_duration(prediction['expected_seconds'])}, "
+            f"over the budget of {format_duration(get_search_budget()[0])}. Please narrow down your answers."
+        )
+        st.session_state.search_refused = None
+
+    if st.session_state.get('search_cancelled'):
+        st.warning("Search cancelled. Submitting the same answers again continues where it stopped.")
+        st.session_state.search_cancelled = False
 
     if st.session_state.validation_set is not None:
         st.session_state.start_time = time.time()
@@ -0,0 +1,1812 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import itertools
+import math
+import hashlib
+import functools
+import heapq
+import json
+import os
+import queue
+import threading
+import time
+import random
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from capitals_gt import country_capitals as COUNTRY_CAPITALS
+from solver_profile import SolverProfile
+from typing import List, Tuple, Optional, Dict, Callable, Iterator, Union
+
+# Exhausted records are merged under a file lock: flock on POSIX, msvcrt on Windows
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# How many odometer states the iterator walks between two calls of its progress and stop hooks
+POLL_INTERVAL = 4096
+# Where interrupted searches leave their position, and how often it is rewritten. The
+# environment variable moves it, e.g. off a read-only checkout, and reaches spawned workers
+CHECKPOINT_DIR_ENV = 'SOLVER_CHECKPOINT_DIR'
+CHECKPOINT_DIR = os.environ.get(
+    CHECKPOINT_DIR_ENV, os.path.join(os.path.dirname(os.path.abspath(__file__)), '.solver_checkpoints')
+)
+CHECKPOINT_SECONDS = 5.0
+# Layout of the iterator state in checkpoints, bumped whenever it changes so older files are ignored
+CHECKPOINT_VERSION = 2
+# How often pool workers report their position and hash count to the driving thread
+PROGRESS_SECONDS = 0.5
+# Background searches nobody asked for progress() this long are taken as abandoned, like those
+# of a closed browser tab, and are cancelled with their position checkpointed
+SEARCH_IDLE_SECONDS = 60.0
+# Weight of every further capital relative to the one clicked before it, between 0 and 1
+CLICK_ORDER_DECAY = 0.5
+# How long the search loop runs to measure this host's hash rate before the first prediction
+CALIBRATION_SECONDS = 0.3
+# Country midstates the confidence ordering keeps, those of every order of as many subsets as fit.
+# Past k! = KEYS_MIDSTATE_CACHE none are kept and permutations are decoded one by one
+KEYS_MIDSTATE_CACHE = 1 << 14
+# Width in bits of -log2 probability of the bands the confidence ordering walks one after another
+CONFIDENCE_BAND_BITS = 1.0
+# Slack on summed -log2 probabilities, far above float rounding and far below a band
+CONFIDENCE_EPSILON = 1e-9
+
+
+def iter_subsets_by_size(sizes: List[int], k: int) -> Iterator[Tuple[int, ...]]:
+    """Yield every k-subset of indices in non-decreasing order of the product of their sizes
+
+    Subsets are positions in the size-sorted order, and each one has a single parent
+    obtained by moving its leftmost movable element one step left. The parent is never
+    larger, so popping the tree from a heap visits subsets in order while only the
+    frontier is kept in memory.
+    """
+    n = len(sizes)
+    if k > n:
+        return
+    order = sorted(range(n), key=lambda i: sizes[i])
+
+    def weight(positions):
+        return math.prod(sizes[order[p]] for p in positions)
+
+    root = tuple(range(k))
+    heap = [(weight(root), root)]
+    while heap:
+        _, positions = heapq.heappop(heap)
+        yield tuple(sorted(order[p] for p in positions))
+
+        for j in range(k):
+            # Position j may only move while all positions before it are packed at the start
+            if j > 0 and positions[j - 1] != j - 1:
+                break
+            limit = positions[j + 1] if j + 1 < k else n
+            if positions[j] + 1 < limit:
+                child = positions[:j] + (positions[j] + 1,) + positions[j + 1:]
+                heapq.heappush(heap, (weight(child), child))
+
+def unrank_permutation(rank: int, k: int) -> Tuple[int, ...]:
+    """Decode the rank-th permutation of range(k) in lexicographic order from its Lehmer code"""
+    remaining = list(range(k))
+    perm = []
+    for position in range(k - 1, -1, -1):
+        digit, rank = divmod(rank, math.factorial(position))
+        perm.append(remaining.pop(digit))
+    return tuple(perm)
+
+def iter_combinations_from(start: Tuple[int, ...], n: int) -> Iterator[Tuple[int, ...]]:
+    """Yield k-subsets of range(n) in itertools.combinations order, beginning at start"""
+    subset = list(start)
+    k = len(subset)
+    while True:
+        yield tuple(subset)
+        i = k - 1
+        while i >= 0 and subset[i] == n - k + i:
+            i -= 1
+        if i < 0:
+            return
+        subset[i] += 1
+        for j in range(i + 1, k):
+            subset[j] = subset[j - 1] + 1
+
+
+class SearchSpace:
+    """Bijection between global integer ranks and (subset, permutation, choice vector, cost) candidates
+
+    Subsets are ordered like itertools.combinations, permutations by their Lehmer rank,
+    capital choices as a mixed-radix number with the last question fastest, and the cost
+    last. Every subset owns a contiguous rank block whose length is its number of candidates.
+    In canonical order only the identity permutation is part of the space.
+    """
+    def __init__(
+        self,
+        initial_lengths: List[List[int]],
+        k: int,
+        cost_of_mistake: int,
+        canonical_order: bool = False
+    ):
+        self.initial_lengths = initial_lengths
+        self.group_sizes = [math.prod(lengths) for lengths in initial_lengths]
+        self.n = len(initial_lengths)
+        self.k = k
+        self.num_perms = 1 if canonical_order else math.factorial(k)
+        self.num_costs = cost_of_mistake + 1
+
+        # suffix_esp[j][t] is the summed size of all t-subsets of groups j..n-1
+        self.suffix_esp = [[0] * (k + 1) for _ in range(self.n + 1)]
+        self.suffix_esp[self.n][0] = 1
+        for j in range(self.n - 1, -1, -1):
+            self.suffix_esp[j][0] = 1
+            for t in range(1, k + 1):
+                self.suffix_esp[j][t] = (
+                    self.suffix_esp[j + 1][t] + self.group_sizes[j] * self.suffix_esp[j + 1][t - 1]
+                )
+        self.size = self.suffix_esp[0][k] * self.num_perms * self.num_costs
+
+    def bases(self, subset: Tuple[int, ...], perm_idx: int) -> List[int]:
+        """Option counts of the questions of subset, laid out in permutation order"""
+        perm = unrank_permutation(perm_idx, self.k)
+        return list(itertools.chain.from_iterable(self.initial_lengths[subset[i]] for i in perm))
+
+    def unrank(self, rank: int) -> Tuple[Tuple[int, ...], int, List[int], int]:
+        """Return the (subset, perm_idx, choice_idx, cost) candidate at the given rank"""
+        if not 0 <= rank < self.size:
+            raise ValueError(f"Rank {rank} is outside of the search space [0, {self.size})")
+        per_product = self.num_perms * self.num_costs
+        subset = []
+        product = 1
+        remaining = self.k
+        for j in range(self.n):
+            if remaining == 0:
+                break
+            block = product * self.group_sizes[j] * self.suffix_esp[j + 1][remaining - 1] * per_product
+            if rank < block:
+                subset.append(j)
+                product *= self.group_sizes[j]
+                remaining -= 1
+            else:
+                rank -= block
+        subset = tuple(subset)
+
+        perm_idx, rank = divmod(rank, product * self.num_costs)
+        choice_rank, cost = divmod(rank, self.num_costs)
+        bases = self.bases(subset, perm_idx)
+        choice_idx = [0] * len(bases)
+        for i in range(len(bases) - 1, -1, -1):
+            choice_rank, choice_idx[i] = divmod(choice_rank, bases[i])
+        return subset, perm_idx, choice_idx, cost
+
+    def rank(self, subset: Tuple[int, ...], perm_idx: int, choice_idx: List[int], cost: int) -> int:
+        """Inverse of unrank"""
+        per_product = self.num_perms * self.num_costs
+        chosen = set(subset)
+        rank = 0
+        product = 1
+        remaining = self.k
+        for j in range(self.n):
+            if remaining == 0:
+                break
+            if j in chosen:
+                product *= self.group_sizes[j]
+                remaining -= 1
+            else:
+                rank += product * self.group_sizes[j] * self.suffix_esp[j + 1][remaining - 1] * per_product
+
+        choice_rank = 0
+        for base, idx in zip(self.bases(subset, perm_idx), choice_idx):
+            choice_rank = choice_rank * base + idx
+        return rank + (perm_idx * product + choice_rank) * self.num_costs + cost
+
+    def split(self, parts: int) -> List[Tuple[int, int]]:
+        """Cut [0, size) into parts contiguous half-open ranges of (almost) equal length"""
+        bounds = [self.size * part // parts for part in range(parts + 1)]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+
+class _SearchIterator:
+    """Setup and hooks shared by the search orderings
+
+    Both encode the quiz once, hash the countries of a group order into a midstate that every
+    candidate of that order extends, and pause through should_stop and on_progress.
+    """
+    def __init__(
+        self,
+        initial_data: List[List[Tuple[str, List[str]]]],
+        k: int,
+        target_hash: str,
+        cost_of_mistake: int,
+        shard: Tuple[int, int],
+        should_stop: Optional[Callable[[], bool]],
+        on_progress: Optional[Callable[['_SearchIterator'], None]],
+        searched_data: Optional[List[List[Tuple[str, List[str]]]]],
+        profile: Optional[SolverProfile],
+        canonical_order: bool,
+    ):
+        self.initial_data = initial_data
+        self.k = k
+        self.n = len(initial_data)
+        self.target_hash = target_hash
+        self.cost_of_mistake = cost_of_mistake
+        # Only units with unit number % shard_count == shard_index are searched
+        self.shard_index, self.shard_count = shard
+        # A stop request pauses the iterator: next() returns no match with stopped set,
+        # and calling it again continues from the same state
+        self.should_stop = should_stop
+        self.on_progress = on_progress
+        self.stopped = False
+        self.states_until_poll = POLL_INTERVAL
+        self.hashes_computed = 0
+        self.profile = profile
+        # With a detailed profile the loops also time every phase of a state
+        self.detailed_profile = profile if profile is not None and profile.detailed else None
+        encoding_start = time.perf_counter()
+
+        self.initial_lengths = [
+            [len(options) for _, options in task]
+            for task in self.initial_data
+        ]
+
+        # Everything the hot loop hashes is encoded once here
+        self.encoded_data = [
+            [(key.encode(), [option.encode() for option in options]) for key, options in task]
+            for task in self.initial_data
+        ]
+        self.cost_suffixes = [str(cost).encode() for cost in range(cost_of_mistake + 1)]
+        self.target_digest = bytes.fromhex(target_hash)
+        if profile is not None:
+            profile.timers['encoding'] += time.perf_counter() - encoding_start
+
+        # Option positions an earlier exhausted search already covered, per question
+        if searched_data is None:
+            self.searched_options = None
+        else:
+            self.searched_options = [
+                [
+                    [idx for idx, option in enumerate(options) if option in old_options]
+                    for (_, options), (_, old_options) in zip(task, old_task)
+                ]
+                for task, old_task in zip(initial_data, searched_data)
+            ]
+
+        # A quiz committed in canonical order hashed its groups sorted, so only the identity is tried
+        self.canonical_order = canonical_order
+        self.num_perms = 1 if canonical_order else math.factorial(k)
+        self.finished = False
+
+    def _keys_midstate(self, group_order: Tuple[int, ...]):
+        """sha256 that has absorbed the countries of the groups in this order, to be copied"""
+        return hashlib.sha256(b''.join(
+            key for group in group_order for key, _ in self.encoded_data[group]
+        ))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        hashes_before = self.hashes_computed
+        result = self._next_midstate()
+        # A detailed profile counted the hashes state by state already
+        if self.profile is not None and self.detailed_profile is None:
+            self.profile.counters['hashes'] += self.hashes_computed - hashes_before
+        return result
+
+    def _poll(self) -> bool:
+        """Report progress and return True if the search has to pause before the current state"""
+        if self.on_progress is not None:
+            self.on_progress(self)
+        if self.should_stop is not None and self.should_stop():
+            self.stopped = True
+        return self.stopped
+
+
+class AllCombinationsIterator(_SearchIterator):
+    def __init__(
+        self,
+        initial_data: List[List[Tuple[str, List[str]]]],
+        k: int,
+        target_hash: str,
+        cost_of_mistake: int,
+        shard: Tuple[int, int] = (0, 1),
+        should_stop: Optional[Callable[[], bool]] = None,
+        rank_range: Optional[Tuple[int, int]] = None,
+        resume_from: Optional[Dict] = None,
+        on_progress: Optional[Callable[['AllCombinationsIterator'], None]] = None,
+        searched_data: Optional[List[List[Tuple[str, List[str]]]]] = None,
+        profile: Optional[SolverProfile] = None,
+        canonical_order: bool = False,
+    ):
+        if searched_data is not None and rank_range is not None:
+            raise ValueError("searched_data cannot be combined with a rank range")
+        super().__init__(
+            initial_data, k, target_hash, cost_of_mistake, shard, should_stop,
+            on_progress, searched_data, profile, canonical_order
+        )
+        self.group_sizes = [math.prod(lengths) for lengths in self.initial_lengths]
+        self.subset_idx = 0
+        # Permutations are decoded from perm_idx on demand instead of being stored
+        self.perm_idx = 0
+        self.boxes = []
+        self.box_idx = 0
+        self.bases = []
+        self.choice_idx = []
+
+        # Without a rank range subsets are visited best-first, with one they follow SearchSpace
+        # rank order and position is the rank of the current odometer state with cost 0
+        self.space = SearchSpace(self.initial_lengths, k, cost_of_mistake, canonical_order)
+        self.rank_start, self.rank_end = rank_range if rank_range is not None else (0, None)
+        self.position = 0
+        if resume_from is not None and resume_from['finished']:
+            self._finish()
+        elif rank_range is None:
+            self.index_subsets = iter_subsets_by_size(self.group_sizes, k)
+            if resume_from is not None:
+                self._resume(resume_from)
+            else:
+                self._init_subset()
+                self._skip_units()
+        else:
+            if resume_from is not None:
+                self.rank_start = max(self.rank_start, resume_from['position'])
+                self.hashes_computed = resume_from.get('hashes_computed', 0)
+            if self.rank_start >= min(self.rank_end, self.space.size):
+                self._finish()
+            else:
+                subset, perm_idx, choice_idx, cost = self.space.unrank(self.rank_start)
+                self.index_subsets = iter_combinations_from(subset, self.n)
+                self._init_subset()
+                self.perm_idx = perm_idx
+                self._init_perm(perm_idx)
+                self.choice_idx = choice_idx
+                self.position = self.rank_start - cost
+
+    def _resume(self, state: Dict):
+        """Replay the best-first subset order up to a checkpointed odometer state"""
+        for _ in range(state['subset_idx']):
+            next(self.index_subsets, None)
+        self.subset_idx = state['subset_idx']
+        self._init_subset()
+        if self.finished:
+            return
+        self.perm_idx = state['perm_idx']
+        self._init_perm(self.perm_idx)
+        self._init_box(state.get('box_idx', 0))
+        self.choice_idx = list(state['choice_idx'])
+        self.position = state['position']
+        self.hashes_computed = state.get('hashes_computed', 0)
+
+    def checkpoint(self) -> Dict:
+        """Position of the first state not hashed yet, accepted back as resume_from"""
+        return {
+            'subset_idx': self.subset_idx,
+            'perm_idx': self.perm_idx,
+            'box_idx': self.box_idx,
+            'choice_idx': list(self.choice_idx),
+            'position': self.position,
+            'hashes_computed': self.hashes_computed,
+            'finished': self.finished,
+        }
+
+    def _init_subset(self):
+        subset = next(self.index_subsets, None)
+        if subset is None:
+            self._finish()
+            return
+        self.subset_indices = list(subset)
+        if self.profile is not None:
+            self.profile.enter_subset(subset)
+        self.perm_idx = 0
+        self._init_perm(0)
+
+    def _init_perm(self, perm_idx):
+        setup_start = time.perf_counter()
+        self.perm = unrank_permutation(perm_idx, self.k)
+        self.group_order = [self.subset_indices[i] for i in self.perm]
+        encoded_flat = list(itertools.chain.from_iterable(
+            self.encoded_data[group] for group in self.group_order
+        ))
+        self.unit_options = [options for _, options in encoded_flat]
+        self.boxes = self._unit_boxes()
+        # prefix_hashes[d] has absorbed the countries and the first d chosen capitals,
+        # only depths >= dirty_depth are stale after the odometer moves
+        self.prefix_hashes = [None] * (len(encoded_flat) + 1)
+        self.encoded_prefix = b''.join(key for key, _ in encoded_flat)
+        self.prefix_hashes[0] = self._keys_midstate(self.group_order)
+        if self.boxes:
+            self._init_box(0)
+        if self.profile is not None:
+            self.profile.timers['unit_setup'] += time.perf_counter() - setup_start
+            self.profile.counters['units'] += 1
+
+    def _unit_boxes(self) -> List[List[List[int]]]:
+        """Split the unit into boxes of allowed option positions per question
+
+        Without searched_data the whole unit is one box. Otherwise box j holds the candidates
+        whose first option unseen by the earlier search sits at question j: questions before
+        j keep their searched options, question j its new ones and later questions all.
+        """
+        every_option = [list(range(len(options))) for options in self.unit_options]
+        if self.searched_options is None:
+            return [every_option]
+
+        searched = [
+            searched_idx
+            for group in self.group_order
+            for searched_idx in self.searched_options[group]
+        ]
+        boxes = []
+        for j, (options, old) in enumerate(zip(every_option, searched)):
+            fresh = [idx for idx in options if idx not in old]
+            if fresh:
+                boxes.append(searched[:j] + [fresh] + every_option[j + 1:])
+            if not old:
+                break
+        return boxes
+
+    def _init_box(self, box_idx):
+        self.box_idx = box_idx
+        self.allowed = self.boxes[box_idx]
+        self.bases = [len(allowed) for allowed in self.allowed]
+        self.choice_idx = [0] * len(self.bases)
+        self.encoded_options = [
+            [options[idx] for idx in allowed]
+            for options, allowed in zip(self.unit_options, self.allowed)
+        ]
+        self.dirty_depth = 0
+
+    def _owns_unit(self) -> bool:
+        unit = self.subset_idx * self.num_perms + self.perm_idx
+        return unit % self.shard_count == self.shard_index
+
+    def _skip_units(self):
+        """Move forward to the next (subset, permutation) unit of this shard that has candidates"""
+        while not self.finished and (not self.boxes or not self._owns_unit()):
+            self._next_unit()
+
+    def _next_unit(self):
+        self.perm_idx += 1
+        if self.perm_idx < self.num_perms:
+            self._init_perm(self.perm_idx)
+        else:
+            self.subset_idx += 1
+            self._init_subset()
+
+    def _finish(self):
+        self.finished = True
+        self.choice_idx = []
+
+    def _cost_window(self) -> Tuple[int, int]:
+        """Costs of the current odometer state that fall inside the rank range"""
+        if self.rank_end is None:
+            return 0, len(self.cost_suffixes)
+        return (
+            max(self.rank_start - self.position, 0),
+            min(self.rank_end - self.position, len(self.cost_suffixes))
+        )
+
+    def _next_midstate(self):
+        """Hash candidates one by one, extending cached midstates only past the changed depth
+
+        With a detailed profile every phase of a state is timed into it. Whether to time is
+        decided once per poll, so the regular loop only pays a local flag test per phase.
+        """
+        cost_suffixes = self.cost_suffixes
+        target_digest = self.target_digest
+        profile = self.detailed_profile
+        timed = profile is not None
+        clock = time.perf_counter
+        self.stopped = False
+        while not self.finished:
+            self.states_until_poll -= 1
+            if self.states_until_poll <= 0:
+                self.states_until_poll = POLL_INTERVAL
+                if self._poll():
+                    break
+                profile = self.detailed_profile
+                timed = profile is not None
+            low_cost, high_cost = self._cost_window()
+            if low_cost >= high_cost:
+                self._finish()
+                break
+
+            if timed:
+                assembly_start = clock()
+            prefix_hashes = self.prefix_hashes
+            choice_idx = self.choice_idx
+            encoded_options = self.encoded_options
+            for depth in range(self.dirty_depth, len(choice_idx)):
+                prefix_hash = prefix_hashes[depth].copy()
+                prefix_hash.update(encoded_options[depth][choice_idx[depth]])
+                prefix_hashes[depth + 1] = prefix_hash
+            self.dirty_depth = len(choice_idx)
+
+            if timed:
+                hashing_start = clock()
+            values_hash = prefix_hashes[-1]
+            for cost in range(low_cost, high_cost):
+                current_hash = values_hash.copy()
+                current_hash.update(cost_suffixes[cost])
+                if current_hash.digest() == target_digest:
+                    self.hashes_computed += cost - low_cost + 1
+                    if timed:
+                        profile.record_state(
+                            profile.subset,
+                            cost - low_cost + 1,
+                            hashing_start - assembly_start,
+                            clock() - hashing_start,
+                            0.0
+                        )
+                    return self._match(self.group_order, self.allowed, self.choice_idx, cost)
+
+            self.hashes_computed += high_cost - low_cost
+            if not timed:
+                self._advance()
+                continue
+
+            advance_start = clock()
+            # _advance may enter the next subset and unit, whose setup is timed separately
+            subset = profile.subset
+            setup_before = profile.timers['unit_setup']
+            self._advance()
+            profile.record_state(
+                subset,
+                high_cost - low_cost,
+                hashing_start - assembly_start,
+                advance_start - hashing_start,
+                clock() - advance_start - (profile.timers['unit_setup'] - setup_before)
+            )
+
+        return [], [], 0
+
+    def _match(
+        self,
+        group_order: List[int],
+        allowed: List[List[int]],
+        choice_idx: List[int],
+        cost: int
+    ) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]], int]:
+        """Decode an odometer state back into (country, capital) pairs"""
+        flat_data = itertools.chain.from_iterable(
+            self.initial_data[group] for group in group_order
+        )
+        validation_set = [
+            (key, options[positions[idx]])
+            for (key, options), positions, idx in zip(flat_data, allowed, choice_idx)
+        ]
+        return validation_set, get_outside_values(self.initial_data, validation_set), cost
+
+    def _advance(self):
+        self.position += len(self.cost_suffixes)
+        i = len(self.choice_idx) - 1
+        while i >= 0:
+            self.choice_idx[i] += 1
+            if self.choice_idx[i] < self.bases[i]:
+                self.dirty_depth = i
+                return
+            self.choice_idx[i] = 0
+            i -= 1
+
+        if self.box_idx + 1 < len(self.boxes):
+            self._init_box(self.box_idx + 1)
+            return
+        self._next_unit()
+        self._skip_units()
+
+
+def option_probabilities(num_options: int) -> List[float]:
+    """Estimated chance of each selected capital being the correct one, in click order
+
+    A question with a single selected capital is certain, wider selections spread the
+    chance over more capitals and earlier clicks get CLICK_ORDER_DECAY times more of it.
+    """
+    weights = [CLICK_ORDER_DECAY ** idx for idx in range(num_options)]
+    total = sum(weights)
+    return [weight / total for weight in weights]
+
+
+class ConfidenceOrderIterator(_SearchIterator):
+    """Search over (subset, capital choice) candidates, most likely first by estimated probability
+
+    A candidate's probability is the product of option_probabilities over its questions, and
+    all of its permutations and costs are hashed together. Candidates are walked in bands
+    CONFIDENCE_BAND_BITS wide in -log2 probability. A band pulls the subsets whose best
+    candidate can fall inside it in best-first order, and walks the choices of each depth-first,
+    pruned to the band. Memory stays at the subset frontier and one choice path, whatever the
+    number of candidates visited, and each candidate is visited in exactly one band. Shards own
+    whole subsets by their place in the subset order. Hooks, searched_data and
+    checkpoints work as in AllCombinationsIterator, units being the visited candidates instead
+    of (subset, permutation) pairs.
+    """
+    def __init__(
+        self,
+        initial_data: List[List[Tuple[str, List[str]]]],
+        k: int,
+        target_hash: str,
+        cost_of_mistake: int,
+        shard: Tuple[int, int] = (0, 1),
+        should_stop: Optional[Callable[[], bool]] = None,
+        rank_range: Optional[Tuple[int, int]] = None,
+        resume_from: Optional[Dict] = None,
+        on_progress: Optional[Callable[['ConfidenceOrderIterator'], None]] = None,
+        searched_data: Optional[List[List[Tuple[str, List[str]]]]] = None,
+        profile: Optional[SolverProfile] = None,
+        canonical_order: bool = False,
+    ):
+        if rank_range is not None:
+            raise ValueError("Rank ranges follow SearchSpace order, use AllCombinationsIterator")
+        super().__init__(
+            initial_data, k, target_hash, cost_of_mistake, shard, should_stop,
+            on_progress, searched_data, profile, canonical_order
+        )
+        # Candidates of a subset come one after another, so the midstates of all its group orders
+        # are reused. The cache is bounded by midstates, not subsets, and skipped for large k
+        if self.num_perms <= KEYS_MIDSTATE_CACHE:
+            self.perms = list(itertools.islice(itertools.permutations(range(k)), self.num_perms))
+            self._perm_midstates = functools.lru_cache(
+                maxsize=KEYS_MIDSTATE_CACHE // self.num_perms
+            )(self._perm_midstates)
+        else:
+            self.perms = None
+
+        # Options are already sorted by decreasing probability, so costs grow along each question
+        self.option_costs = [
+            [[-math.log2(probability) for probability in option_probabilities(len(options))] for _, options in task]
+            for task in initial_data
+        ]
+        self.best_costs = [sum(costs[0] for costs in task) for task in self.option_costs]
+        self.worst_costs = [sum(costs[-1] for costs in task) for task in self.option_costs]
+        # iter_subsets_by_size yields growing products, inverse probabilities make that best-first
+        self.top_inverse = [2 ** cost for cost in self.best_costs]
+        first_subset = next(iter_subsets_by_size(self.top_inverse, k), None)
+        self.top_cost = sum(self.best_costs[group] for group in first_subset) if first_subset else 0.0
+        self.worst_cost = sum(sorted(self.worst_costs)[len(self.worst_costs) - k:]) if first_subset else -math.inf
+
+        self.candidates = self._iter_candidates()
+        self.visited = 0
+        self.perm_idx = 0
+        self.subset = None
+
+        if resume_from is not None and resume_from['finished']:
+            self._finish()
+        elif resume_from is not None:
+            self._resume(resume_from)
+        else:
+            self._next_entry()
+
+    def _iter_candidates(self) -> Iterator[Tuple[Tuple[int, ...], Tuple[int, ...]]]:
+        """Every candidate of this shard that still needs hashing, band by band"""
+        band = 0
+        while self.top_cost + band * CONFIDENCE_BAND_BITS <= self.worst_cost + CONFIDENCE_EPSILON:
+            low = self.top_cost + band * CONFIDENCE_BAND_BITS
+            high = low + CONFIDENCE_BAND_BITS
+            for ordinal, subset in enumerate(iter_subsets_by_size(self.top_inverse, self.k)):
+                if sum(self.best_costs[group] for group in subset) > high + CONFIDENCE_EPSILON:
+                    break
+                if ordinal % self.shard_count != self.shard_index:
+                    continue
+                if sum(self.worst_costs[group] for group in subset) < low - CONFIDENCE_EPSILON:
+                    continue
+                if self.profile is not None:
+                    self.profile.enter_subset(subset)
+                yield from self._iter_band_choices(subset, band, low, high)
+            band += 1
+
+    def _iter_band_choices(
+        self,
+        subset: Tuple[int, ...],
+        band: int,
+        low: float,
+        high: float
+    ) -> Iterator[Tuple[Tuple[int, ...], Tuple[int, ...]]]:
+        """Choice vectors of subset whose -log2 probability falls in the band, depth-first"""
+        costs = [question_costs for group in subset for question_costs in self.option_costs[group]]
+        searched = None
+        if self.searched_options is not None:
+            searched = [searched_idx for group in subset for searched_idx in self.searched_options[group]]
+        # Cheapest and dearest completion of the questions from i on
+        min_rest = [0.0] * (len(costs) + 1)
+        max_rest = [0.0] * (len(costs) + 1)
+        for i in range(len(costs) - 1, -1, -1):
+            min_rest[i] = min_rest[i + 1] + costs[i][0]
+            max_rest[i] = max_rest[i + 1] + costs[i][-1]
+
+        choice = [-1] * len(costs)
+        partial = [0.0] * (len(costs) + 1)
+        depth = 0
+        while depth >= 0:
+            choice[depth] += 1
+            if choice[depth] == len(costs[depth]):
+                depth -= 1
+                continue
+            total = partial[depth] + costs[depth][choice[depth]]
+            if total + min_rest[depth + 1] > high + CONFIDENCE_EPSILON:
+                # Later options only cost more
+                depth -= 1
+                continue
+            if total + max_rest[depth + 1] < low - CONFIDENCE_EPSILON:
+                continue
+            if depth + 1 < len(costs):
+                depth += 1
+                partial[depth] = total
+                choice[depth] = -1
+                continue
+            # The band of a candidate is decided on its own summed cost, the same in every band
+            if max(math.floor((total - self.top_cost) / CONFIDENCE_BAND_BITS), 0) != band:
+                continue
+            # Candidates made only of options an earlier exhausted search had are already hashed
+            if searched is not None and all(idx in searched_idx for idx, searched_idx in zip(choice, searched)):
+                continue
+            yield subset, tuple(choice)
+
+    def _next_entry(self):
+        """Move to the next candidate of this shard that still needs hashing"""
+        setup_start = time.perf_counter()
+        self.perm_idx = 0
+        entry = next(self.candidates, None)
+        if entry is None:
+            self._finish()
+            return
+        self.visited += 1
+        self._init_entry(*entry)
+        if self.profile is not None:
+            self.profile.timers['unit_setup'] += time.perf_counter() - setup_start
+            self.profile.counters['units'] += 1
+
+    def _init_entry(self, subset: Tuple[int, ...], choice: Tuple[int, ...]):
+        self.subset = subset
+        self.choice = choice
+        self.group_values = []
+        self.group_choices = []
+        offset = 0
+        for group in subset:
+            task = self.encoded_data[group]
+            group_choice = choice[offset:offset + len(task)]
+            offset += len(task)
+            self.group_values.append(b''.join(options[idx] for (_, options), idx in zip(task, group_choice)))
+            self.group_choices.append(group_choice)
+
+    def _resume(self, state: Dict):
+        """Replay the candidate order up to a checkpointed candidate without hashing"""
+        self.hashes_computed = state.get('hashes_computed', 0)
+        entry = None
+        while self.visited < state['visited']:
+            entry = next(self.candidates, None)
+            if entry is None:
+                self._finish()
+                return
+            self.visited += 1
+        if entry is None:
+            self._next_entry()
+            return
+        self._init_entry(*entry)
+        self.perm_idx = state['perm_idx']
+
+    def checkpoint(self) -> Dict:
+        """Position of the first permutation not hashed yet, accepted back as resume_from"""
+        return {
+            'visited': self.visited,
+            'perm_idx': self.perm_idx,
+            'hashes_computed': self.hashes_computed,
+            'finished': self.finished,
+        }
+
+    def _finish(self):
+        self.finished = True
+
+    def _perm_midstates(self, subset: Tuple[int, ...]) -> List:
+        """Country midstates of every permutation of subset, in perms order"""
+        return [self._keys_midstate([subset[i] for i in perm]) for perm in self.perms]
+
+    def _remaining_perms(self) -> Iterator[Tuple]:
+        """(permutation, country midstate) of the current candidate from perm_idx on, in Lehmer rank order"""
+        if self.perms is not None:
+            return zip(
+                itertools.islice(self.perms, self.perm_idx, None),
+                itertools.islice(self._perm_midstates(self.subset), self.perm_idx, None)
+            )
+        return (
+            (perm, self._keys_midstate([self.subset[i] for i in perm]))
+            for perm in map(unrank_permutation, range(self.perm_idx, self.num_perms), itertools.repeat(self.k))
+        )
+
+    def _next_midstate(self):
+        """Hash every permutation of each candidate from the midstate of its group order's countries
+
+        With a detailed profile every permutation is timed as a state, finding the next
+        candidate as unit setup. Whether to time is decided once per poll.
+        """
+        cost_suffixes = self.cost_suffixes
+        target_digest = self.target_digest
+        profile = self.detailed_profile
+        timed = profile is not None
+        clock = time.perf_counter
+        self.stopped = False
+        while not self.finished:
+            subset = self.subset
+            values = self.group_values
+            remaining_perms = self._remaining_perms()
+            while self.perm_idx < self.num_perms:
+                self.states_until_poll -= 1
+                if self.states_until_poll <= 0:
+                    self.states_until_poll = POLL_INTERVAL
+                    if self._poll():
+                        return [], [], 0
+                    profile = self.detailed_profile
+                    timed = profile is not None
+
+                if timed:
+                    assembly_start = clock()
+                perm, midstate = next(remaining_perms)
+                values_hash = midstate.copy()
+                values_hash.update(b''.join([values[i] for i in perm]))
+
+                if timed:
+                    hashing_start = clock()
+                for cost, cost_suffix in enumerate(cost_suffixes):
+                    current_hash = values_hash.copy()
+                    current_hash.update(cost_suffix)
+                    if current_hash.digest() == target_digest:
+                        self.hashes_computed += cost + 1
+                        if timed:
+                            profile.record_state(
+                                subset, cost + 1, hashing_start - assembly_start, clock() - hashing_start, 0.0
+                            )
+                        return self._match(subset, perm, self.group_choices, cost)
+                self.hashes_computed += len(cost_suffixes)
+                self.perm_idx += 1
+                if timed:
+                    profile.record_state(
+                        subset, len(cost_suffixes), hashing_start - assembly_start, clock() - hashing_start, 0.0
+                    )
+            self._next_entry()
+
+        return [], [], 0
+
+    def _match(
+        self,
+        subset: Tuple[int, ...],
+        perm: Tuple[int, ...],
+        group_choices: List[Tuple[int, ...]],
+        cost: int
+    ) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]], int]:
+        validation_set = [
+            (key, options[idx])
+            for i in perm
+            for (key, options), idx in zip(self.initial_data[subset[i]], group_choices[i])
+        ]
+        return validation_set, get_outside_values(self.initial_data, validation_set), cost
+
+# Candidate orderings find_validation_set can search in: subsets by size with an odometer
+# inside each, or every candidate by its estimated probability
+SEARCH_ORDERINGS = {
+    'size': AllCombinationsIterator,
+    'confidence': ConfidenceOrderIterator,
+}
+
+
+def get_outside_values(
+    initial_data: List[List[Tuple[str, List[str]]]],
+    validation_set: List[Tuple[str, str]]
+) -> List[Tuple[str, str]]:
+    """Pick a random selected capital for every question outside the validation set"""
+    chosen_keys = {key for key, _ in validation_set}
+    outside_values = []
+    for group in initial_data:
+        for key, options in group:
+            if key not in chosen_keys:
+                outside_values.append((key, random.choice(options)))
+    return outside_values
+
+
+_stop_event = None
+_progress_queue = None
+
+def _init_search_worker(stop_event, progress_queue=None):
+    global _stop_event, _progress_queue
+    _stop_event = stop_event
+    _progress_queue = progress_queue
+
+def _search_shard(
+    initial_data: List[List[Tuple[str, List[str]]]],
+    k: int,
+    target_hash: str,
+    cost_of_mistake: int,
+    shard: Tuple[int, int],
+    searched_data: Optional[List[List[Tuple[str, List[str]]]]] = None,
+    resume_from: Optional[Dict] = None,
+    profile_detailed: Optional[bool] = None,
+    canonical_order: bool = False,
+    ordering: str = 'size'
+) -> Tuple[List[Tuple[str, str]], int, Dict, Optional[SolverProfile]]:
+    """Search one shard inside a worker process and tell the others to stop on a match"""
+    profile = SolverProfile(profile_detailed) if profile_detailed is not None else None
+    last_report = time.monotonic()
+
+    def report_progress(iterator: AllCombinationsIterator):
+        nonlocal last_report
+        if _progress_queue is not None and time.monotonic() - last_report >= PROGRESS_SECONDS:
+            _progress_queue.put((shard[0], iterator.checkpoint()))
+            last_report = time.monotonic()
+
+    combinator = SEARCH_ORDERINGS[ordering](
+        initial_data,
+        k,
+        target_hash,
+        cost_of_mistake,
+        shard=shard,
+        should_stop=_stop_event.is_set,
+        resume_from=resume_from,
+        on_progress=report_progress,
+        searched_data=searched_data,
+        profile=profile,
+        canonical_order=canonical_order
+    )
+    validation_set, _, cost = next(combinator)
+    if validation_set:
+        _stop_event.set()
+    return validation_set, cost, combinator.checkpoint(), profile
+
+
+class BackgroundSearch:
+    """Validation-set search on a thread that drives a process pool
+
+    The subsets x permutations space is sharded round-robin across the workers. The calling
+    thread stays free to poll progress() and to cancel() the workers at any time. Once done,
+    result holds the usual triple, or None if the search was cancelled before it ended.
+    search_space is the number of candidates it hashes at most, resumed hashes included.
+    With an idle_timeout, a search whose progress() was not polled for that many seconds
+    cancels itself and checkpoints its position, abandoned is then set.
+    """
+    def __init__(
+        self,
+        initial_data: List[List[Tuple[str, List[str]]]],
+        k: int,
+        target_hash: str,
+        cost_of_mistake: int,
+        workers: int,
+        searched_data: Optional[List[List[Tuple[str, List[str]]]]] = None,
+        checkpoint: Optional[Dict] = None,
+        fingerprint: Optional[str] = None,
+        already_exhausted: bool = False,
+        profile: Optional[SolverProfile] = None,
+        canonical_order: bool = False,
+        ordering: str = 'size',
+        idle_timeout: Optional[float] = None
+    ):
+        self.initial_data = initial_data
+        self.k = k
+        self.target_hash = target_hash
+        self.cost_of_mistake = cost_of_mistake
+        self.workers = workers
+        self.searched_data = searched_data
+        self.fingerprint = fingerprint
+        self.already_exhausted = already_exhausted
+        self.canonical_order = canonical_order
+        self.ordering = ordering
+        # Every worker fills a profile of its own, they are merged here as shards finish
+        self.profile = profile
+
+        self.shard_states = checkpoint['shards'] if checkpoint is not None else [None] * workers
+        self.shard_hashes = [state['hashes_computed'] if state else 0 for state in self.shard_states]
+        self.resumed_hashes = sum(self.shard_hashes)
+        self.search_space = remaining_space_size(initial_data, k, cost_of_mistake, canonical_order, searched_data)
+        self.result = None
+        self.error = None
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.idle_timeout = idle_timeout
+        self.polled_at = self.started_at
+        self.abandoned = False
+
+        self.stop_event = multiprocessing.Event()
+        self.progress_queue = multiprocessing.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        if already_exhausted:
+            self.result = [], [], 0
+            self.finished_at = self.started_at
+        else:
+            self.thread.start()
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def cancel(self):
+        """Ask every worker to stop, their positions are kept in checkpoint()"""
+        self.stop_event.set()
+
+    def join(self, timeout: Optional[float] = None):
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+    def checkpoint(self) -> Dict:
+        return {
+            'target_hash': self.target_hash,
+            'fingerprint': self.fingerprint,
+            'workers': self.workers,
+            'shards': list(self.shard_states),
+        }
+
+    def progress(self, total_hashes: Optional[int] = None) -> Dict:
+        """Hashes tried so far, hashes/sec of this run, share of the space covered and worst-case ETA
+
+        The share and ETA are taken over total_hashes, the whole search space by default.
+        """
+        self.polled_at = time.monotonic()
+        hashes = sum(self.shard_hashes)
+        elapsed = (self.finished_at or self.polled_at) - self.started_at
+        rate = (hashes - self.resumed_hashes) / elapsed if elapsed > 0 else 0.0
+        progress = {'hashes': hashes, 'hashes_per_second': rate, 'elapsed': elapsed}
+        total_hashes = self.search_space if total_hashes is None else total_hashes
+        if total_hashes:
+            progress['fraction'] = min(hashes / total_hashes, 1.0)
+            progress['eta'] = max(total_hashes - hashes, 0) / rate if rate > 0 else None
+        return progress
+
+    def _drain_progress(self, finished_shards: set):
+        while True:
+            try:
+                shard_index, state = self.progress_queue.get_nowait()
+            except queue.Empty:
+                return
+            if shard_index not in finished_shards:
+                self.shard_states[shard_index] = state
+                self.shard_hashes[shard_index] = state['hashes_computed']
+
+    def _run(self):
+        if self.profile is not None:
+            self.profile.start()
+        try:
+            self._search()
+            if self.abandoned and self.result is None and self.fingerprint is not None:
+                save_checkpoint(self.checkpoint())
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+        finally:
+            if self.profile is not None:
+                self.profile.stop()
+            self.finished_at = time.monotonic()
+
+    def _search(self):
+        finished_shards = set()
+        last_save = time.monotonic()
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_search_worker,
+            initargs=(self.stop_event, self.progress_queue)
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _search_shard,
+                    self.initial_data,
+                    self.k,
+                    self.target_hash,
+                    self.cost_of_mistake,
+                    (shard_index, self.workers),
+                    self.searched_data,
+                    self.shard_states[shard_index],
+                    self.profile.detailed if self.profile is not None else None,
+                    self.canonical_order,
+                    self.ordering
+                ): shard_index
+                for shard_index in range(self.workers)
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=PROGRESS_SECONDS, return_when=FIRST_COMPLETED)
+                self._drain_progress(finished_shards)
+                for future in done:
+                    shard_index = futures[future]
+                    validation_set, cost, state, worker_profile = future.result()
+                    if worker_profile is not None:
+                        self.profile.merge(worker_profile)
+                    finished_shards.add(shard_index)
+                    self.shard_states[shard_index] = state
+                    self.shard_hashes[shard_index] = state['hashes_computed']
+                    if validation_set and self.result is None:
+                        self.stop_event.set()
+                        self.result = validation_set, get_outside_values(self.initial_data, validation_set), cost
+
+                if self.fingerprint is not None and time.monotonic() - last_save >= CHECKPOINT_SECONDS:
+                    save_checkpoint(self.checkpoint())
+                    last_save = time.monotonic()
+                if self.idle_timeout is not None and time.monotonic() - self.polled_at > self.idle_timeout:
+                    self.abandoned = True
+                    self.stop_event.set()
+
+        if self.result is None and not self.stop_event.is_set():
+            self.result = [], [], 0
+
+def parallel_search(
+    initial_data: List[List[Tuple[str, List[str]]]],
+    k: int,
+    target_hash: str,
+    cost_of_mistake: int,
+    workers: int,
+    searched_data: Optional[List[List[Tuple[str, List[str]]]]] = None,
+    profile: Optional[SolverProfile] = None,
+    canonical_order: bool = False,
+    ordering: str = 'size'
+) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]], int]:
+    """Split the subsets x permutations space across a process pool, stop every worker on the first match"""
+    describe_search(profile, initial_data, k, cost_of_mistake, workers, canonical_order, ordering)
+    search = BackgroundSearch(
+        initial_data,
+        k,
+        target_hash,
+        cost_of_mistake,
+        workers,
+        searched_data,
+        profile=profile,
+        canonical_order=canonical_order,
+        ordering=ordering
+    )
+    search.join()
+    if search.error is not None:
+        raise search.error
+    return search.result
+
+def describe_search(
+    profile: Optional[SolverProfile],
+    initial_data: List[List[Tuple[str, List[str]]]],
+    k: int,
+    cost_of_mistake: int,
+    workers: int,
+    canonical_order: bool = False,
+    ordering: str = 'size'
+):
+    """Note the size of the search and how it runs in the profile report"""
+    if profile is None:
+        return
+    initial_lengths = [[len(options) for _, options in task] for task in initial_data]
+    profile.info.update({
+        'groups': len(initial_data),
+        'k': k,
+        'cost_of_mistake': cost_of_mistake,
+        'canonical_order': canonical_order,
+        'ordering': ordering,
+        'search_space': SearchSpace(initial_lengths, k, cost_of_mistake, canonical_order).size,
+        'workers': workers,
+    })
+
+def sum_over_k_subsets(
+    A: List[List[Tuple[str, List[str]]]], 
+    k: int
+) -> int:
+    """Sum of the option-count products over all k-subsets of groups, in O(len(A) * k)"""
+    # esp[j] is the elementary symmetric polynomial of degree j over the group products seen so far
+    esp = [1] + [0] * k
+    for task in A:
+        product = math.prod(len(vals) if len(vals) > 0 else 4 for _, vals in task)
+        for j in range(k, 0, -1):
+            esp[j] += esp[j - 1] * product
+    return esp[k]
+
+def validation_message(validation_set: List[Tuple[str, str]], cost) -> str:
+    """The string whose sha256 is the target hash: countries, then capitals, then the cost"""
+    countries = ''.join(country for country, _ in validation_set)
+    capitals = ''.join(capital for _, capital in validation_set)
+    return countries + capitals + str(cost)
+
+def answers_fingerprint(
+    group_variants: List[List[Tuple[str, List[str]]]],
+    k: int,
+    cost_of_mistake: int,
+    searched_data: Optional[List[List[Tuple[str, List[str]]]]] = None,
+    canonical_order: bool = False,
+    ordering: str = 'size'
+) -> str:
+    """Digest of everything that defines the search space of a submission and its checkpoints"""
+    payload = [group_variants, k, cost_of_mistake, searched_data]
+    if canonical_order:
+        payload.append('canonical')
+    if ordering != 'size':
+        payload.append(ordering)
+    payload = json.dumps(payload, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def set_checkpoint_dir(path: str):
+    """Keep checkpoints and exhausted searches in path, for this process and the workers it starts"""
+    global CHECKPOINT_DIR
+    CHECKPOINT_DIR = path
+    os.environ[CHECKPOINT_DIR_ENV] = path
+
+def _checkpoint_path(target_hash: str, fingerprint: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, f"{target_hash[:16]}-{fingerprint[:16]}.json")
+
+def save_checkpoint(checkpoint: Dict):
+    """Store a solver checkpoint on disk so it survives reruns and restarts, safe to call from any thread
+
+    The file is stamped with CHECKPOINT_VERSION.
+    """
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    path = _checkpoint_path(checkpoint['target_hash'], checkpoint['fingerprint'])
+    # Per-process temporary files, so concurrent searches of one target never share one
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump({**checkpoint, 'version': CHECKPOINT_VERSION}, f)
+    os.replace(temp_path, path)
+
+def load_checkpoint(target_hash: str, fingerprint: str, workers: int) -> Optional[Dict]:
+    """Find the checkpoint left by an earlier search over the same answers, target and shard layout
+
+    Checkpoints written by another CHECKPOINT_VERSION, or without one, are ignored.
+    """
+    path = _checkpoint_path(target_hash, fingerprint)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('version') != CHECKPOINT_VERSION or checkpoint['workers'] != workers:
+        return None
+    return checkpoint
+
+def clear_checkpoint(target_hash: str, fingerprint: str):
+    """Forget the checkpoint once its search has finished"""
+    path = _checkpoint_path(target_hash, fingerprint)
+    if os.path.exists(path):
+        os.remove(path)
+
+def _exhausted_path(target_hash: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, f"{target_hash[:16]}-exhausted.json")
+
+def load_exhausted_searches(target_hash: str) -> List[Dict]:
+    """Answers that were already searched to the end without matching this target"""
+    path = _exhausted_path(target_hash)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """Hold an exclusive lock on path + '.lock' across processes, released when the block ends
+
+    The lock file may be removed by its holder, see clear_exhausted_searches. A lock taken on
+    a removed file guards nothing, so it is taken again on the file now at that path.
+    """
+    lock_path = f"{path}.lock"
+    while True:
+        lock_file = open(lock_path, 'a+b')
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.samestat(os.fstat(lock_file.fileno()), os.stat(lock_path)):
+                    break
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+        else:
+            # Windows cannot remove a file others hold open, so the lock file is always current
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            break
+    try:
+        yield lock_path
+    finally:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        lock_file.close()
+
+def record_exhausted_search(
+    target_hash: str,
+    group_variants: List[List[Tuple[str, List[str]]]],
+    k: int,
+    cost_of_mistake: int,
+    canonical_order: bool = False
+):
+    """Remember that these answers cannot produce the target hash
+
+    Concurrent searches of one target, like batch jobs, merge their records under a file
+    lock and replace the file atomically, so none is lost and readers never see a partial file.
+    """
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    path = _exhausted_path(target_hash)
+    with _file_lock(path):
+        records = load_exhausted_searches(target_hash) + [{
+            'k': k,
+            'cost_of_mistake': cost_of_mistake,
+            'canonical_order': canonical_order,
+            'answers': group_variants
+        }]
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(records, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+def clear_exhausted_searches(target_hash: str):
+    """Forget every exhausted search of this target, removing its lock file with the records"""
+    path = _exhausted_path(target_hash)
+    if not os.path.exists(f"{path}.lock") and not os.path.exists(path):
+        return
+    with _file_lock(path) as lock_path:
+        if os.path.exists(path):
+            os.remove(path)
+        try:
+            os.remove(lock_path)
+        except OSError:
+            # Still open elsewhere on Windows, it is left for the next clear
+            pass
+
+def find_searched_baseline(
+    group_variants: List[List[Tuple[str, List[str]]]],
+    k: int,
+    cost_of_mistake: int,
+    records: List[Dict],
+    canonical_order: bool = False
+) -> Tuple[Optional[List[List[Tuple[str, List[str]]]]], bool]:
+    """Pick the exhausted answers that overlap the new ones most
+
+    Returns those answers and whether they already cover every selected option,
+    in which case nothing is left to search. A search over every group order also
+    covers the canonical one, but not the other way round.
+    """
+    keys = [[key for key, _ in task] for task in group_variants]
+    best, best_overlap = None, -1
+    for record in records:
+        old_data = record['answers']
+        if record['k'] != k or record['cost_of_mistake'] != cost_of_mistake:
+            continue
+        if record.get('canonical_order', False) and not canonical_order:
+            continue
+        if [[key for key, _ in task] for task in old_data] != keys:
+            continue
+        overlap = 0
+        covered = True
+        for task, old_task in zip(group_variants, old_data):
+            for (_, options), (_, old_options) in zip(task, old_task):
+                seen = sum(option in old_options for option in options)
+                overlap += seen
+                covered = covered and seen == len(options)
+        if covered:
+            return old_data, True
+        if overlap > best_overlap:
+            best, best_overlap = old_data, overlap
+    return best, False
+
+def search_rank_range(
+    initial_data: List[List[Tuple[str, List[str]]]],
+    k: int,
+    target_hash: str,
+    cost_of_mistake: int,
+    start: int,
+    end: int,
+    canonical_order: bool = False
+) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]], int]:
+    """Search only the candidates whose SearchSpace rank lies in [start, end)"""
+    combinator = AllCombinationsIterator(
+        initial_data,
+        k,
+        target_hash,
+        cost_of_mistake,
+        rank_range=(start, end),
+        canonical_order=canonical_order
+    )
+    return next(combinator)
+
+@functools.lru_cache(maxsize=None)
+def measure_hash_rate(k: int, questions_per_group: int, cost_of_mistake: int, ordering: str = 'size') -> float:
+    """Hashes/sec of one core running the real search loop on a quiz shaped like the current one
+
+    Measured once per process and quiz shape, on real country and capital names so messages
+    have their usual length. The target never matches, the loop is stopped after CALIBRATION_SECONDS.
+    """
+    rng = random.Random(0)
+    countries = rng.sample(sorted(COUNTRY_CAPITALS), (k + 2) * questions_per_group)
+    capitals = list(COUNTRY_CAPITALS.values())
+    initial_data = [
+        [(country, rng.sample(capitals, 4)) for country in countries[i:i + questions_per_group]]
+        for i in range(0, len(countries), questions_per_group)
+    ]
+    start = time.perf_counter()
+    deadline = start + CALIBRATION_SECONDS
+    combinator = SEARCH_ORDERINGS[ordering](
+        initial_data,
+        k,
+        '0' * 64,
+        cost_of_mistake,
+        should_stop=lambda: time.perf_counter() >= deadline
+    )
+    next(combinator)
+    return combinator.hashes_computed / (time.perf_counter() - start)
+
+def remaining_space_size(
+    group_variants: List[List[Tuple[str, List[str]]]],
+    k: int,
+    cost_of_mistake: int,
+    canonical_order: bool = False,
+    searched_data: Optional[List[List[Tuple[str, List[str]]]]] = None
+) -> int:
+    """Candidates a search of these answers hashes at most, leaving out those an exhausted search had"""
+    lengths = [[len(options) for _, options in task] for task in group_variants]
+    size = SearchSpace(lengths, k, cost_of_mistake, canonical_order).size
+    if searched_data is None:
+        return size
+    # Only candidates made entirely of options both answers share were hashed before
+    shared_lengths = [
+        [
+            sum(option in old_options for option in options)
+            for (_, options), (_, old_options) in zip(task, old_task)
+        ]
+        for task, old_task in zip(group_variants, searched_data)
+    ]
+    return size - SearchSpace(shared_lengths, k, cost_of_mistake, canonical_order).size
+
+def predict_search_time(
+    group_variants: List[List[Tuple[str, List[str]]]],
+    k: int,
+    cost_of_mistake: int,
+    workers: int = 1,
+    ordering: str = 'size',
+    canonical_order: bool = False,
+    searched_data: Optional[List[List[Tuple[str, List[str]]]]] = None
+) -> Dict:
+    """Expected and worst-case hashes of a search and the wall time this host needs for them
+
+    Candidates an exhausted search already covered are not counted. Workers are assumed to
+    scale linearly up to the number of cores.
+    """
+    worst_case = remaining_space_size(group_variants, k, cost_of_mistake, canonical_order, searched_data)
+    cores = max(1, min(workers, os.cpu_count() or 1))
+    rate = measure_hash_rate(k, len(group_variants[0]) if group_variants else 1, cost_of_mistake, ordering) * cores
+    return {
+        'expected_hashes': worst_case // 2,
+        'worst_case_hashes': worst_case,
+        'hashes_per_second': rate,
+        'expected_seconds': worst_case / 2 / rate,
+        'worst_case_seconds': worst_case / rate,
+    }
+
+class SearchBudgetExceeded(ValueError):
+    """Raised before any hashing when a search is predicted to take longer than its time budget"""
+    def __init__(self, prediction: Dict, time_budget: float):
+        self.prediction = prediction
+        self.time_budget = time_budget
+        super().__init__(
+            f"Search is expected to take {prediction['expected_seconds']:.1f}s, "
+            f"over the budget of {time_budget:.1f}s"
+        )
+
+def check_search_budget(prediction: Dict, time_budget: float):
+    """Raise SearchBudgetExceeded when the expected search time is over the budget"""
+    if prediction['expected_seconds'] > time_budget:
+        raise SearchBudgetExceeded(prediction, time_budget)
+
+class SearchTimeout:
+    """Outcome of a search stopped by its deadline or hash limit before it ended
+
+    checkpoint is the position it stopped at, it is saved like that of a cancelled search,
+    so submitting the same answers again continues from there.
+    """
+    def __init__(self, hashes: int, search_space: int, elapsed: float, checkpoint: Dict):
+        self.hashes = hashes
+        self.search_space = search_space
+        self.elapsed = elapsed
+        self.checkpoint = checkpoint
+
+    @property
+    def fraction(self) -> float:
+        """Share of the candidates left to search that were hashed, over all runs so far"""
+        return min(self.hashes / self.search_space, 1.0) if self.search_space else 1.0
+
+    def __repr__(self) -> str:
+        return f"SearchTimeout(hashes={self.hashes}, fraction={self.fraction:.4f}, elapsed={self.elapsed:.2f})"
+
+# Background searches by target hash, from start_search until finish_validation_search
+_background_searches: Dict[str, BackgroundSearch] = {}
+_background_searches_lock = threading.Lock()
+
+def stop_search_at(search: BackgroundSearch, deadline: Optional[float] = None, max_hashes: Optional[int] = None):
+    """Wait for a background search, cancelling it after deadline seconds or max_hashes new hashes"""
+    while not search.done:
+        search.join(PROGRESS_SECONDS)
+        progress = search.progress()
+        new_hashes = progress['hashes'] - search.resumed_hashes
+        if (deadline is not None and progress['elapsed'] >= deadline) or (
+            max_hashes is not None and new_hashes >= max_hashes
+        ):
+            search.cancel()
+            search.join()
+
+def start_search(
+    group_variants: List[List[Tuple[str, List[str]]]],
+    k: int,
+    target_hash: str,
+    cost_of_mistake: int,
+    workers: int,
+    profile: Optional[SolverProfile] = None,
+    ordering: str = 'size',
+    canonical_order: bool = False,
+    time_budget: Optional[float] = None,
+    idle_timeout: Optional[float] = SEARCH_IDLE_SECONDS
+) -> BackgroundSearch:
+    """Start searching for answers in the background, resuming any checkpoint
+
+    Searches are registered by target hash until finish_validation_search. A caller that
+    lost its handle, like a refreshed app page, gets the running search back when it submits
+    the same answers again. Any other search for the target hash is cancelled first and
+    its position checkpointed. A search whose progress() nobody polls for idle_timeout
+    seconds is cancelled and checkpointed as well, so a closed app page stops its pool.
+    With a time_budget, SearchBudgetExceeded is raised instead when the search is
+    predicted to take longer than that many seconds.
+    """
+    exhausted = load_exhausted_searches(target_hash)
+    searched_data, covered = find_searched_baseline(group_variants, k, cost_of_mistake, exhausted, canonical_order)
+    fingerprint = answers_fingerprint(group_variants, k, cost_of_mistake, searched_data, canonical_order, ordering)
+    with _background_searches_lock:
+        previous = _background_searches.get(target_hash)
+        if previous is not None:
+            if previous.fingerprint == fingerprint and (not previous.done or previous.result is not None):
+                return previous
+            _stop_background_search(previous)
+
+        if time_budget is not None and not covered:
+            check_search_budget(
+                predict_search_time(group_variants, k, cost_of_mistake, workers, ordering, canonical_order, searched_data),
+                time_budget
+            )
+        describe_search(profile, group_variants, k, cost_of_mistake, workers, canonical_order, ordering)
+        search = BackgroundSearch(
+            group_variants,
+            k,
+            target_hash,
+            cost_of_mistake,
+            workers,
+                searched_data=searched_data,
+            checkpoint=load_checkpoint(target_hash, fingerprint, workers),
+            fingerprint=fingerprint,
+            already_exhausted=covered,
+            profile=profile,
+            canonical_order=canonical_order,
+            ordering=ordering,
+            idle_timeout=idle_timeout
+        )
+        _background_searches[target_hash] = search
+    return search
+
+def _stop_background_search(search: BackgroundSearch):
+    """Cancel a registered search nobody finishes anymore, keeping its position for a resubmission"""
+    del _background_searches[search.target_hash]
+    search.cancel()
+    search.join()
+    if search.error is not None:
+        return
+    if search.result is None:
+        save_checkpoint(search.checkpoint())
+    elif not search.result[0] and not search.already_exhausted:
+        record_exhausted_search(
+            search.target_hash, search.initial_data, search.k, search.cost_of_mistake, search.canonical_order
+        )
+
+def finish_validation_search(
+    search: BackgroundSearch
+) -> Optional[Tuple[List[Tuple[str, str]], List[Tuple[str, str]], int]]:
+    """Record the outcome of a finished background search, return its result and unregister it"""
+    with _background_searches_lock:
+        if _background_searches.get(search.target_hash) is search:
+            del _background_searches[search.target_hash]
+    if search.error is not None:
+        raise search.error
+    if search.result is None:
+        save_checkpoint(search.checkpoint())
+        return None
+    clear_checkpoint(search.target_hash, search.fingerprint)
+    if not search.result[0] and not search.already_exhausted:
+        record_exhausted_search(
+            search.target_hash, search.initial_data, search.k, search.cost_of_mistake, search.canonical_order
+        )
+    return search.result
+
+def search_validation_set(
+    group_variants: List[List[Tuple[str, List[str]]]],
+    k: int,
+    target_hash: str,
+    cost_of_mistake: int,
+    workers: Optional[int] = None,
+    profile: Optional[SolverProfile] = None,
+    ordering: str = 'size',
+    canonical_order: bool = False,
+    time_budget: Optional[float] = None,
+    deadline: Optional[float] = None,
+    max_hashes: Optional[int] = None,
+    listen: Optional[Tuple[str, int]] = None
+) -> Tuple[Optional[List[Tuple[str, str]]], List[Tuple[str, str]], Union[int, SearchTimeout]]:
+    """Find the validation set of these answers that matches target hash, with last attempts for the other questions
+
+    group_variants lists the groups sorted by group number, each a list of (country, selected capitals).
+
+    With workers > 1 the search runs on that many processes instead of the calling one.
+    The search checkpoints its position every CHECKPOINT_SECONDS and continues from the
+    last checkpoint when the same answers are submitted again.
+    Answers that were searched to the end are remembered: a resubmission only hashes
+    candidates using a newly selected capital, and one that only removed capitals is
+    answered without hashing.
+    With canonical_order, for quizzes that hash their validation groups sorted by group
+    number, only k-subsets are searched and not their orders.
+    The ordering picks one of SEARCH_ORDERINGS: 'size' walks subsets by their number of
+    candidates, 'confidence' tries the most likely candidates across all subsets first.
+    A SolverProfile collects counters and phase timings of the search for its report().
+    With a time_budget in seconds, searches predicted to run longer raise SearchBudgetExceeded
+    before any hashing.
+    A deadline in seconds or a max_hashes count of new hashes stops the search cleanly once
+    reached (checked every POLL_INTERVAL states, or PROGRESS_SECONDS with workers). It then
+    returns None as validation set, a random selected capital for every question and a
+    SearchTimeout with the share of the space covered and the checkpoint to resume from.
+    With a listen address, a cluster.Coordinator hands out rank ranges to workers local
+    (as many as workers) and on other hosts. That mode searches the whole space, only
+    stops on a deadline and keeps no checkpoint on disk.
+    """
+    if listen is not None:
+        # Imported here since cluster builds on this module
+        from cluster import cluster_search
+        exhausted = load_exhausted_searches(target_hash)
+        if find_searched_baseline(group_variants, k, cost_of_mistake, exhausted, canonical_order)[1]:
+            return [], [], 0
+        result = cluster_search(
+            group_variants, k, target_hash, cost_of_mistake, workers if workers is not None else 1,
+            listen, canonical_order, deadline
+        )
+        if result[0] == []:
+            record_exhausted_search(target_hash, group_variants, k, cost_of_mistake, canonical_order)
+        return result
+
+    if workers is not None and workers > 1:
+        search = start_search(
+            group_variants, k, target_hash, cost_of_mistake, workers,
+            profile, ordering, canonical_order, time_budget
+        )
+        stop_search_at(search, deadline, max_hashes)
+        result = finish_validation_search(search)
+        if result is not None:
+            return result
+        return None, get_outside_values(search.initial_data, []), SearchTimeout(
+            sum(search.shard_hashes),
+            search.search_space,
+            search.progress()['elapsed'],
+            search.checkpoint()
+        )
+
+    exhausted = load_exhausted_searches(target_hash)
+    searched_data, covered = find_searched_baseline(group_variants, k, cost_of_mistake, exhausted, canonical_order)
+    if covered:
+        return [], [], 0
+    if time_budget is not None:
+        check_search_budget(
+            predict_search_time(group_variants, k, cost_of_mistake, 1, ordering, canonical_order, searched_data),
+            time_budget
+        )
+
+    fingerprint = answers_fingerprint(group_variants, k, cost_of_mistake, searched_data, canonical_order, ordering)
+    checkpoint = load_checkpoint(target_hash, fingerprint, 1)
+    last_save = time.monotonic()
+
+    def save_progress(iterator: AllCombinationsIterator):
+        nonlocal last_save
+        if time.monotonic() - last_save >= CHECKPOINT_SECONDS:
+            save_checkpoint({
+                'target_hash': target_hash,
+                'fingerprint': fingerprint,
+                'workers': 1,
+                'shards': [iterator.checkpoint()],
+            })
+            last_save = time.monotonic()
+
+    started_at = time.monotonic()
+    resumed_hashes = checkpoint['shards'][0]['hashes_computed'] if checkpoint is not None else 0
+
+    def out_of_time() -> bool:
+        return (deadline is not None and time.monotonic() - started_at >= deadline) or (
+            max_hashes is not None and combinator.hashes_computed - resumed_hashes >= max_hashes
+        )
+
+    describe_search(profile, group_variants, k, cost_of_mistake, 1, canonical_order, ordering)
+    if profile is not None:
+        profile.start()
+    combinator = SEARCH_ORDERINGS[ordering](
+        group_variants,
+        k,
+        target_hash,
+        cost_of_mistake,
+        resume_from=checkpoint['shards'][0] if checkpoint is not None else None,
+        should_stop=out_of_time if deadline is not None or max_hashes is not None else None,
+        on_progress=save_progress,
+        searched_data=searched_data,
+        profile=profile,
+        canonical_order=canonical_order
+    )
+    result = next(combinator)
+    if profile is not None:
+        profile.stop()
+    if combinator.stopped:
+        state = {
+            'target_hash': target_hash,
+            'fingerprint': fingerprint,
+            'workers': 1,
+            'shards': [combinator.checkpoint()],
+        }
+        save_checkpoint(state)
+        return None, get_outside_values(group_variants, []), SearchTimeout(
+            combinator.hashes_computed,
+            remaining_space_size(group_variants, k, cost_of_mistake, canonical_order, searched_data),
+            time.monotonic() - started_at,
+            state
+        )
+    clear_checkpoint(target_hash, fingerprint)
+    if not result[0]:
+        record_exhausted_search(target_hash, group_variants, k, cost_of_mistake, canonical_order)
+    return result
+
+def solve_job(
+    job: Dict,
+    **kwargs
+) -> Tuple[Optional[List[Tuple[str, str]]], List[Tuple[str, str]], Union[int, SearchTimeout]]:
+    """Run search_validation_set on a JSON job with groups, k, target_hash, cost_of_mistake and canonical_order
+
+    groups lists every group as [country, [selected capitals]] pairs, canonical_order is optional.
+    Keyword arguments go to search_validation_set.
+    """
+    group_variants = [[(country, capitals) for country, capitals in group] for group in job['groups']]
+    return search_validation_set(
+        group_variants,
+        job['k'],
+        job['target_hash'],
+        job['cost_of_mistake'],
+        canonical_order=job.get('canonical_order', False),
+        **kwargs
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Search the validation set of one set of answers")
+    parser.add_argument('job', help="JSON file with groups, k, target_hash, cost_of_mistake and canonical_order, - for stdin")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--ordering', choices=sorted(SEARCH_ORDERINGS), default='size')
+    parser.add_argument('--deadline', type=float, default=60.0, help="seconds before giving up")
+    parser.add_argument(
+        '--checkpoint-dir', help=f"where checkpoints and exhausted searches are kept, default ${CHECKPOINT_DIR_ENV} "
+                                 "or .solver_checkpoints next to this module"
+    )
+    parser.add_argument(
+        '--forget-exhausted', action='store_true', help="search again answers recorded as exhausted for the target"
+    )
+    args = parser.parse_args(argv)
+
+    if args.checkpoint_dir is not None:
+        set_checkpoint_dir(args.checkpoint_dir)
+    if args.job == '-':
+        job = json.load(sys.stdin)
+    else:
+        with open(args.job) as f:
+            job = json.load(f)
+    if args.forget_exhausted:
+        clear_exhausted_searches(job['target_hash'])
+    validation_set, last_attempts, cost = solve_job(
+        job, workers=args.workers, ordering=args.ordering, deadline=args.deadline
+    )
+    if validation_set is None:
+        print(
+            f"Algorithm was unable to find an answer in {args.deadline:g}s ({cost.fraction:.1%} of candidates tried). "
+            "Try to lower the range of your answers"
+        )
+        print("\nLast attempted answers:")
+        for country, capital in last_attempts:
+            print(f"{country}\t{capital}")
+        return 2
+    if not validation_set:
+        print("No matching validation set found!")
+        return 1
+    print(f"Found validation set with cost {cost}:")
+    for country, capital in validation_set:
+        print(f"{country}\t{capital}")
+    print("\nLast attempted answers for other questions:")
+    for country, capital in last_attempts:
+        print(f"{country}\t{capital}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Where the solver's time goes, in the order a candidate passes through them
+PHASES = ('encoding', 'unit_setup', 'assembly', 'hashing', 'advance')
+
+
+class SolverProfile:
+    """Opt-in counters and phase timers filled by the search iterators of every ordering
+
+    encoding is the one-off conversion of the answers to bytes, unit_setup decoding a
+    permutation and absorbing its countries (for the confidence ordering, finding the next
+    candidate), assembly extending the midstates with chosen capitals, hashing the cost
+    suffixes and digest comparisons, advance stepping the odometer, which the confidence
+    ordering does not have. Profiles of pool workers are merged into the one passed by the
+    caller. Without detailed, the search keeps its regular loop and
+    only wall time, hash and unit counts are recorded.
+    """
+    def __init__(self, detailed: bool = True):
+        self.detailed = detailed
+        self.timers = dict.fromkeys(PHASES, 0.0)
+        self.counters = defaultdict(int)
+        self.subset_hashes = defaultdict(int)
+        self.subset_seconds = defaultdict(float)
+        self.subset = None
+        self.started_at = None
+        self.wall_seconds = 0.0
+        self.info = {}
+
+    def start(self):
+        self.started_at = time.perf_counter()
+
+    def stop(self):
+        if self.started_at is not None:
+            self.wall_seconds += time.perf_counter() - self.started_at
+            self.started_at = None
+
+    def enter_subset(self, subset: Tuple[int, ...]):
+        self.subset = subset
+        self.counters['subsets'] += 1
+
+    def record_state(self, subset: Tuple[int, ...], hashes: int, assembly: float, hashing: float, advance: float):
+        """Account one odometer state of the scalar loop to its subset"""
+        timers = self.timers
+        timers['assembly'] += assembly
+        timers['hashing'] += hashing
+        timers['advance'] += advance
+        self.counters['states'] += 1
+        self.counters['hashes'] += hashes
+        self.subset_hashes[subset] += hashes
+        self.subset_seconds[subset] += assembly + hashing + advance
+
+    def merge(self, other: 'SolverProfile'):
+        """Add the counters and timers of another profile, e.g. one returned by a worker"""
+        for phase, seconds in other.timers.items():
+            self.timers[phase] += seconds
+        for name, count in other.counters.items():
+            self.counters[name] += count
+        for subset, count in other.subset_hashes.items():
+            self.subset_hashes[subset] += count
+        for subset, seconds in other.subset_seconds.items():
+            self.subset_seconds[subset] += seconds
+
+    def report(self) -> Dict[str, Any]:
+        """JSON-serialisable summary: totals, hashes/sec, time per phase and per subset"""
+        hashes = self.counters['hashes']
+        measured = sum(self.timers.values())
+        subsets = [
+            {
+                'subset': list(subset),
+                'hashes': count,
+                'seconds': self.subset_seconds[subset],
+                'hashes_per_second': count / self.subset_seconds[subset] if self.subset_seconds[subset] > 0 else None,
+            }
+            for subset, count in self.subset_hashes.items()
+        ]
+        subsets.sort(key=lambda entry: entry['hashes'], reverse=True)
+        return {
+            **self.info,
+            'wall_seconds': self.wall_seconds,
+            'hashes': hashes,
+            'hashes_per_second': hashes / self.wall_seconds if self.wall_seconds > 0 else None,
+            'counters': dict(self.counters),
+            'phases': {
+                phase: {'seconds': seconds, 'share': seconds / measured if measured > 0 else 0.0}
+                for phase, seconds in self.timers.items()
+            },
+            'subsets': subsets,
+        }
+
+    def write_report(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def profile_call(
+    func: Callable,
+    *args,
+    profiler: str = 'cprofile',
+    output: Optional[str] = None,
+    **kwargs
+) -> Tuple[Any, str]:
+    """Run func under cProfile or pyinstrument and return its result with the rendered profile
+
+    With output set, cProfile stats are dumped there for snakeviz/pstats and pyinstrument
+    writes an HTML page.
+    """
+    if profiler == 'cprofile':
+        profile = cProfile.Profile()
+        result = profile.runcall(func, *args, **kwargs)
+        if output is not None:
+            profile.dump_stats(output)
+        text = io.StringIO()
+        pstats.Stats(profile, stream=text).sort_stats('cumulative').print_stats(30)
+        return result, text.getvalue()
+
+    if profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ImportError("pyinstrument is not installed, run pip install pyinstrument")
+        profile = Profiler()
+        profile.start()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            profile.stop()
+        if output is not None:
+            with open(output, 'w') as f:
+                f.write(profile.output_html())
+        return result, profile.output_text()
+
+    raise ValueError(f"Unknown profiler: {profiler}")
@@ -5,7 +5,8 @@ import hashlib
 import itertools
 from typing import List, Tuple, Dict
 from constants import get_parameters
-from capitals_gt import country_capitals as COUNTRY_CAPITALS
+from capitals_gt import country_capitals as COUNTRY_CAPITALS, COUNTRIES, CAPITALS
+from solver import validation_message
 import streamlit as st
 
 
@@ -14,7 +15,8 @@ N = 100
 def generate_quiz(
         num_questions: int = None, 
         validation_size: int = None, 
-        questions_per_group: int = None
+        questions_per_group: int = None,
+        canonical_order: bool = False
     ) -> Tuple[List[Dict], List[Tuple[str, str]]]:
     """Generate a quiz with the specified number of question groups and validation set size"""
     current_num_questions, current_validation_size, current_questions_per_group, _ = get_parameters()
@@ -23,34 +25,49 @@ def generate_quiz(
     questions_per_group = questions_per_group or current_questions_per_group
     
     # Randomly select countries for each group
-    all_countries = list(COUNTRY_CAPITALS.keys())
     questions = []
-    allgroup_countries = random.sample(all_countries, questions_per_group*num_questions)
+    allgroup_ids = random.sample(range(len(COUNTRIES)), questions_per_group*num_questions)
     for group_idx in range(num_questions):
-        group_countries = allgroup_countries[
+        group_ids = allgroup_ids[
             group_idx*questions_per_group : (group_idx+1)*questions_per_group
         ]
         
         group_questions = []
-        for country in group_countries:
-            correct = COUNTRY_CAPITALS[country]
-            wrong_answers = random.sample([c for c in COUNTRY_CAPITALS.values() if c != correct], 3)
-            options = wrong_answers + [correct]
+        for country_id in group_ids:
+            options = [CAPITALS[i] for i in sample_distractors(country_id, 3)] + [CAPITALS[country_id]]
             random.shuffle(options)
             group_questions.append({
-                'country': country,
+                'country': COUNTRIES[country_id],
                 'capitals': options,
                 'group': group_idx + 1
             })
         questions.extend(group_questions)
     
     # Generate validation set
-    validation_set = generate_validation_set(questions, validation_size, questions_per_group)
+    validation_set = generate_validation_set(questions, validation_size, questions_per_group, canonical_order)
     
     return questions, validation_set
 
-def generate_validation_set(questions: List[Dict], validation_size: int, questions_per_group: int) -> List[Tuple[str, str]]:
-    """Generate validation set from questions, ensuring we take complete groups"""
+def sample_distractors(correct_id: int, count: int) -> List[int]:
+    """Draw count distinct wrong capital ids by rejection, O(count) expected while count is far below the capitals"""
+    distractors = []
+    while len(distractors) < count:
+        capital_id = random.randrange(len(CAPITALS))
+        if capital_id != correct_id and capital_id not in distractors:
+            distractors.append(capital_id)
+    return distractors
+
+def generate_validation_set(
+        questions: List[Dict],
+        validation_size: int,
+        questions_per_group: int,
+        canonical_order: bool = False
+    ) -> List[Tuple[str, str]]:
+    """Generate validation set from questions, ensuring we take complete groups
+
+    In canonical order the groups are listed by group number instead of in random order,
+    so the solver does not have to try every order of them.
+    """
     # Group questions by their group number
     grouped_questions = {}
     for q in questions:
@@ -61,6 +78,8 @@ def generate_validation_set(questions: List[Dict], validation_size: int, questio
     
     # Randomly select validation groups
     validation_groups = random.sample(list(grouped_questions.keys()), validation_size)
+    if canonical_order:
+        validation_groups.sort()
     
     # For each validation group, use the correct capital for each country
     validation_set = []
@@ -72,8 +91,8 @@ def generate_validation_set(questions: List[Dict], validation_size: int, questio
     print(validation_set)
     return validation_set
 
-def save_quiz_data(questions: List[Dict], validation_set: List[Tuple[str, str]]):
-    """Save quiz data to session state"""
+def save_quiz_data(questions: List[Dict], validation_set: List[Tuple[str, str]], canonical_order: bool = False):
+    """Save quiz data to session state, along with the group order the hash commits to"""
     # Convert questions to DataFrame format
     tasks_data = []
     for q in questions:
@@ -86,18 +105,14 @@ def save_quiz_data(questions: List[Dict], validation_set: List[Tuple[str, str]])
     # Store in session state
     st.session_state.tasks_df = pd.DataFrame(tasks_data)
     
-    # Calculate and store validation hash
-    countries = ''.join(country for country, _ in validation_set)
-    capitals = ''.join(capital for _, capital in validation_set)
-    combined = countries + capitals
-    
-    # Add random cost to the hash
+    # Calculate and store validation hash, with a random cost added to it
     _, _, _,  cost_of_mistake = get_parameters()
     cost = str(random.randint(0, cost_of_mistake))
-    combined = combined + cost
+    combined = validation_message(validation_set, cost)
     print(combined)
     hash_value = hashlib.sha256(combined.encode()).hexdigest()
     st.session_state.target_hash = hash_value
+    st.session_state.canonical_order = canonical_order
     st.session_state.cost = cost  # Store the cost for verification
 
 def main():
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import random
+import sys
+
+import pytest
+
+# The modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import solver
+from capitals_gt import country_capitals as COUNTRY_CAPITALS
+from solver import SearchSpace, unrank_permutation, validation_message
+
+
+@pytest.fixture(autouse=True)
+def checkpoint_dir(tmp_path, monkeypatch):
+    """Keep every test's checkpoints and exhausted searches out of the real .solver_checkpoints"""
+    monkeypatch.setattr(solver, 'CHECKPOINT_DIR', str(tmp_path / 'checkpoints'))
+    return tmp_path / 'checkpoints'
+
+@pytest.fixture
+def group_variants():
+    """Five groups of two questions with two or three selected capitals each"""
+    rng = random.Random(0)
+    countries = rng.sample(sorted(COUNTRY_CAPITALS), 10)
+    capitals = sorted(set(COUNTRY_CAPITALS.values()))
+    return [
+        [(country, rng.sample(capitals, rng.choice([2, 3]))) for country in countries[i:i + 2]]
+        for i in range(0, len(countries), 2)
+    ]
+
+@pytest.fixture
+def large_group_variants():
+    """Eight groups of two questions with four selected capitals, far too many candidates to finish"""
+    rng = random.Random(0)
+    countries = rng.sample(sorted(COUNTRY_CAPITALS), 16)
+    capitals = sorted(set(COUNTRY_CAPITALS.values()))
+    return [[(country, rng.sample(capitals, 4)) for country in countries[i:i + 2]] for i in range(0, 16, 2)]
+
+def candidate_at(group_variants, k, cost_of_mistake, rank, canonical_order=False):
+    """Target hash, validation set and cost of the candidate at a SearchSpace rank"""
+    space = SearchSpace(
+        [[len(options) for _, options in task] for task in group_variants], k, cost_of_mistake, canonical_order
+    )
+    subset, perm_idx, choice_idx, cost = space.unrank(rank)
+    choices = iter(choice_idx)
+    validation_set = [
+        (country, options[next(choices)])
+        for i in unrank_permutation(perm_idx, k)
+        for country, options in group_variants[subset[i]]
+    ]
+    target_hash = hashlib.sha256(validation_message(validation_set, cost).encode()).hexdigest()
+    return target_hash, validation_set, cost
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from automated_guesser import AutomatedGuesser
+
+NUM_CAPITALS = 5
+NUM_COSTS = 3
+
+
+@pytest.fixture
+def guesser():
+    """Twelve questions with ids 100..111, four of them in the validation set"""
+    np.random.seed(0)
+    test_ids = np.arange(100, 112)
+    validation_ids = np.array([107, 102, 110, 105])
+    return AutomatedGuesser(NUM_CAPITALS, test_ids, validation_ids, np.array([1, 4, 0, 2]), NUM_COSTS)
+
+
+def test_membership_sums_to_num_validation(guesser):
+    assert guesser.membership.sum() == pytest.approx(guesser.num_validation)
+    for _ in range(5):
+        question_ids, guesses_ids = guesser.make_guesses(200)
+        guesser.update_after_wrong_guess(question_ids, guesses_ids)
+        assert guesser.membership.sum() == pytest.approx(guesser.num_validation)
+        assert np.all((guesser.membership >= 0) & (guesser.membership <= 1))
+        assert guesser.answer_probs.sum(axis=1) == pytest.approx(np.ones(guesser.num_test))
+        assert guesser.probs.sum() == pytest.approx(1)
+
+    guesser.update_after_new_info(np.array([107, 110]), np.array([1, 0]))
+    assert guesser.membership.sum() == pytest.approx(guesser.num_validation)
+
+
+def test_leaks_pin_answers(guesser):
+    guesser.update_after_new_info(np.array([107, 102]), np.array([1, 4]))
+    for _ in range(3):
+        question_ids, guesses_ids = guesser.make_guesses(200)
+        guesser.update_after_wrong_guess(question_ids, guesses_ids)
+
+    leaked = guesser._question_indices(np.array([107, 102]))
+    assert guesser.membership[leaked] == pytest.approx([1, 1])
+    assert guesser.answer_probs[leaked[0]] == pytest.approx(np.eye(NUM_CAPITALS)[1])
+    assert guesser.answer_probs[leaked[1]] == pytest.approx(np.eye(NUM_CAPITALS)[4])
+
+    question_ids, guesses_ids = guesser.make_guesses(500)
+    assert np.all(guesses_ids[question_ids == 107] == 1)
+    assert np.all(guesses_ids[question_ids == 102] == 4)
+
+
+def test_unknown_question_ids_are_rejected(guesser):
+    with pytest.raises(ValueError):
+        guesser.update_after_new_info(np.array([99]), np.array([0]))
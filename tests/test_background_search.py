@@ -0,0 +1,38 @@
+import pytest
+
+import solver
+from solver import finish_validation_search, load_checkpoint, start_search
+
+TARGET_HASH = 'f' * 64
+
+
+def test_resubmission_reattaches_and_other_answers_replace(large_group_variants):
+    search = start_search(large_group_variants, 4, TARGET_HASH, 10, 2)
+    try:
+        assert start_search(large_group_variants, 4, TARGET_HASH, 10, 2) is search
+        assert search.progress()['fraction'] < 1.0
+
+        narrowed = [[(country, options[:3]) for country, options in task] for task in large_group_variants]
+        replacement = start_search(narrowed, 4, TARGET_HASH, 10, 2)
+        assert replacement is not search
+        assert search.done and search.result is None
+        assert load_checkpoint(TARGET_HASH, search.fingerprint, 2) is not None
+    finally:
+        for running in [search, solver._background_searches.get(TARGET_HASH)]:
+            if running is not None:
+                running.cancel()
+                running.join()
+                finish_validation_search(running)
+    assert not solver._background_searches
+
+def test_unpolled_search_cancels_itself(large_group_variants):
+    search = start_search(large_group_variants, 4, TARGET_HASH, 10, 2, idle_timeout=1.0)
+    search.join(30)
+    assert search.done and search.abandoned and search.result is None
+    assert load_checkpoint(TARGET_HASH, search.fingerprint, 2) is not None
+
+    resumed = start_search(large_group_variants, 4, TARGET_HASH, 10, 2, idle_timeout=1.0)
+    assert resumed is not search and resumed.resumed_hashes > 0
+    resumed.cancel()
+    resumed.join()
+    assert finish_validation_search(resumed) is None
@@ -0,0 +1,56 @@
+import io
+import json
+
+import pytest
+
+from batch_solver import read_jobs, run_batch, run_job
+from conftest import candidate_at
+
+K = 3
+COST_OF_MISTAKE = 2
+NO_MATCH = 'f' * 64
+
+
+def job_line(group_variants, target_hash, k=K, cost_of_mistake=COST_OF_MISTAKE, **extra):
+    return json.dumps({
+        'groups': group_variants,
+        'k': k,
+        'target_hash': target_hash,
+        'cost_of_mistake': cost_of_mistake,
+        **extra,
+    })
+
+def test_run_job_statuses(group_variants, large_group_variants):
+    target_hash, validation_set, cost = candidate_at(group_variants, K, COST_OF_MISTAKE, 100)
+    found = run_job(1, job_line(group_variants, target_hash, id='quiz-1'), timeout=60.0)
+    assert found['id'] == 'quiz-1'
+    assert found['status'] == 'found'
+    assert [tuple(pair) for pair in found['validation_set']] == validation_set
+    assert found['cost'] == cost
+
+    assert run_job(2, job_line(group_variants, NO_MATCH), timeout=60.0)['status'] == 'not_found'
+
+    timeout = run_job(3, job_line(large_group_variants, NO_MATCH, k=4, cost_of_mistake=10), timeout=0.0)
+    assert timeout['status'] == 'timeout'
+    assert 0 < timeout['fraction'] < 1
+
+@pytest.mark.parametrize('line', ['{not json', json.dumps({'groups': [], 'k': 1})])
+def test_unreadable_jobs_are_errors(line):
+    result = run_job(7, line, timeout=1.0)
+    assert result['id'] == 7
+    assert result['status'] == 'error'
+    assert result['error']
+
+def test_run_batch_writes_a_result_per_job(group_variants):
+    target_hash, _, _ = candidate_at(group_variants, K, COST_OF_MISTAKE, 0)
+    jobs = io.StringIO('\n'.join([
+        job_line(group_variants, target_hash, id='a'),
+        '',
+        job_line(group_variants, NO_MATCH, id='b'),
+        '{not json',
+    ]) + '\n')
+    output = io.StringIO()
+    counts = run_batch(read_jobs(jobs), output, workers=1, timeout=60.0)
+    assert counts == {'found': 1, 'not_found': 1, 'error': 1}
+    results = {result['id']: result['status'] for result in map(json.loads, output.getvalue().splitlines())}
+    assert results == {'a': 'found', 'b': 'not_found', 4: 'error'}
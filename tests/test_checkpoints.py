@@ -0,0 +1,127 @@
+import json
+import math
+import os
+import subprocess
+import sys
+
+import pytest
+
+import solver
+from solver import (
+    SEARCH_ORDERINGS,
+    AllCombinationsIterator,
+    SearchSpace,
+    answers_fingerprint,
+    clear_exhausted_searches,
+    load_checkpoint,
+    load_exhausted_searches,
+    record_exhausted_search,
+    save_checkpoint,
+)
+from conftest import candidate_at
+
+K = 3
+COST_OF_MISTAKE = 2
+
+
+@pytest.fixture(autouse=True)
+def frequent_polls(monkeypatch):
+    """Poll often enough for a small quiz to be interrupted many times"""
+    monkeypatch.setattr(solver, 'POLL_INTERVAL', 64)
+
+def run_in_pieces(iterator_class, group_variants, target_hash, canonical_order=False, polls_per_run=3):
+    """Search, stopping every polls_per_run polls and resuming from a checkpoint saved to disk"""
+    fingerprint = answers_fingerprint(group_variants, K, COST_OF_MISTAKE, canonical_order=canonical_order)
+    state = None
+    runs = 0
+    while True:
+        polls = iter(range(polls_per_run))
+        iterator = iterator_class(
+            group_variants, K, target_hash, COST_OF_MISTAKE,
+            should_stop=lambda: next(polls, None) is None,
+            resume_from=state,
+            canonical_order=canonical_order
+        )
+        result = next(iterator)
+        runs += 1
+        if not iterator.stopped:
+            return result, iterator.hashes_computed, runs
+        save_checkpoint({
+            'target_hash': target_hash,
+            'fingerprint': fingerprint,
+            'workers': 1,
+            'shards': [iterator.checkpoint()],
+        })
+        state = load_checkpoint(target_hash, fingerprint, 1)['shards'][0]
+
+@pytest.mark.parametrize('ordering', sorted(SEARCH_ORDERINGS))
+@pytest.mark.parametrize('canonical_order', [False, True])
+def test_resumed_search_matches_uninterrupted(group_variants, ordering, canonical_order):
+    iterator_class = SEARCH_ORDERINGS[ordering]
+    space = SearchSpace(
+        [[len(options) for _, options in task] for task in group_variants], K, COST_OF_MISTAKE, canonical_order
+    )
+    for rank in [space.size // 3, space.size - 1]:
+        target_hash, validation_set, cost = candidate_at(group_variants, K, COST_OF_MISTAKE, rank, canonical_order)
+        iterator = iterator_class(group_variants, K, target_hash, COST_OF_MISTAKE, canonical_order=canonical_order)
+        expected = next(iterator)
+        assert expected[0] == validation_set and expected[2] == cost
+
+        result, hashes, _ = run_in_pieces(iterator_class, group_variants, target_hash, canonical_order)
+        assert (result[0], result[2]) == (validation_set, cost)
+        assert hashes == iterator.hashes_computed
+
+@pytest.mark.parametrize('ordering', sorted(SEARCH_ORDERINGS))
+def test_resumed_search_without_match_hashes_every_candidate_once(group_variants, ordering):
+    space = SearchSpace([[len(options) for _, options in task] for task in group_variants], K, COST_OF_MISTAKE)
+    result, hashes, runs = run_in_pieces(SEARCH_ORDERINGS[ordering], group_variants, '0' * 64)
+    assert result == ([], [], 0)
+    assert runs > 1
+    assert hashes == space.size
+
+def test_checkpoints_of_another_version_are_ignored(checkpoint_dir):
+    checkpoint = {'target_hash': 'a' * 64, 'fingerprint': 'b' * 64, 'workers': 2, 'shards': [None, None]}
+    save_checkpoint(checkpoint)
+    assert load_checkpoint('a' * 64, 'b' * 64, 2)['shards'] == [None, None]
+    assert load_checkpoint('a' * 64, 'b' * 64, 1) is None
+
+    path = os.path.join(checkpoint_dir, os.listdir(checkpoint_dir)[0])
+    with open(path, 'w') as f:
+        json.dump({**checkpoint, 'version': solver.CHECKPOINT_VERSION - 1}, f)
+    assert load_checkpoint('a' * 64, 'b' * 64, 2) is None
+
+def test_canonical_order_only_hashes_sorted_group_orders(group_variants):
+    space = SearchSpace([[len(options) for _, options in task] for task in group_variants], K, COST_OF_MISTAKE, True)
+    result, hashes, _ = run_in_pieces(AllCombinationsIterator, group_variants, '0' * 64, canonical_order=True)
+    assert result == ([], [], 0)
+    assert hashes == space.size
+    assert space.size * math.factorial(K) == SearchSpace(space.initial_lengths, K, COST_OF_MISTAKE).size
+
+def test_checkpoint_dir_is_configurable(group_variants, tmp_path, monkeypatch):
+    moved = tmp_path / 'moved'
+    monkeypatch.setenv(solver.CHECKPOINT_DIR_ENV, str(moved))
+    imported = subprocess.run(
+        [sys.executable, '-c', 'import solver; print(solver.CHECKPOINT_DIR)'],
+        cwd=os.path.dirname(os.path.abspath(solver.__file__)), capture_output=True, text=True, check=True
+    )
+    assert imported.stdout.strip() == str(moved)
+
+    job_path = tmp_path / 'job.json'
+    job_path.write_text(json.dumps({
+        'groups': group_variants, 'k': K, 'target_hash': '0' * 64, 'cost_of_mistake': COST_OF_MISTAKE
+    }))
+    assert solver.main([str(job_path), '--checkpoint-dir', str(tmp_path / 'flag')]) == 1
+    assert os.path.basename(solver._exhausted_path('0' * 64)) in os.listdir(tmp_path / 'flag')
+
+def test_clearing_exhausted_searches_removes_their_lock_files(group_variants, checkpoint_dir):
+    record_exhausted_search('a' * 64, group_variants, K, COST_OF_MISTAKE)
+    record_exhausted_search('a' * 64, group_variants, K + 1, COST_OF_MISTAKE)
+    record_exhausted_search('b' * 64, group_variants, K, COST_OF_MISTAKE)
+    assert len(load_exhausted_searches('a' * 64)) == 2
+
+    clear_exhausted_searches('a' * 64)
+    assert load_exhausted_searches('a' * 64) == []
+    assert sorted(os.listdir(checkpoint_dir)) == ['b' * 16 + '-exhausted.json', 'b' * 16 + '-exhausted.json.lock']
+    clear_exhausted_searches('a' * 64)
+    record_exhausted_search('a' * 64, group_variants, K, COST_OF_MISTAKE)
+    assert len(load_exhausted_searches('a' * 64)) == 1
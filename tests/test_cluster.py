@@ -0,0 +1,55 @@
+import pytest
+
+from cluster import Coordinator
+from conftest import candidate_at
+
+K = 2
+COST_OF_MISTAKE = 1
+
+
+@pytest.fixture
+def coordinator(group_variants):
+    target_hash, validation_set, cost = candidate_at(group_variants, K, COST_OF_MISTAKE, 7)
+    coordinator = Coordinator(group_variants, K, target_hash, COST_OF_MISTAKE, parts=1)
+    coordinator.start()
+    coordinator.expected = validation_set, cost
+    yield coordinator
+    coordinator.close()
+
+def test_bad_found_requeues_its_range(coordinator):
+    owned = set()
+    assert coordinator.handle({'type': 'hello'}, owned)['type'] == 'job'
+    assigned = coordinator.handle({'type': 'request'}, owned)
+    coordinator.handle({'type': 'progress', 'id': assigned['id'], 'position': assigned['start'] + 4, 'hashes': 4}, owned)
+
+    validation_set, cost = coordinator.expected
+    reply = coordinator.handle(
+        {'type': 'found', 'id': assigned['id'], 'validation_set': validation_set, 'cost': cost + 1, 'hashes': 5},
+        owned
+    )
+    assert reply == {'type': 'stop'}
+    assert not coordinator.finished.is_set() and coordinator.result is None
+    assert list(coordinator.pending) == [(assigned['start'] + 4, assigned['end'])]
+    assert not owned and not coordinator.assigned
+
+    malformed = coordinator.handle({'type': 'found', 'id': 99, 'validation_set': 3, 'cost': 'a', 'hashes': 0}, owned)
+    assert malformed == {'type': 'stop'} and not coordinator.finished.is_set()
+
+    requeued = coordinator.handle({'type': 'request'}, owned)
+    assert (requeued['start'], requeued['end']) == (assigned['start'] + 4, assigned['end'])
+    reply = coordinator.handle(
+        {'type': 'found', 'id': requeued['id'], 'validation_set': validation_set, 'cost': cost, 'hashes': 3},
+        owned
+    )
+    assert reply == {'type': 'stop'}
+    assert coordinator.finished.is_set()
+    assert coordinator.result[0] == validation_set and coordinator.result[2] == cost
+    assert coordinator.handle({'type': 'request'}, owned) == {'type': 'stop'}
+
+def test_dropped_connection_requeues_from_last_position(coordinator):
+    owned = set()
+    assigned = coordinator.handle({'type': 'request'}, owned)
+    coordinator.handle({'type': 'progress', 'id': assigned['id'], 'position': assigned['start'] + 2, 'hashes': 2}, owned)
+    coordinator.release(owned)
+    assert list(coordinator.pending) == [(assigned['start'] + 2, assigned['end'])]
+    assert coordinator.hashes == 2
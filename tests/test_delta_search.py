@@ -0,0 +1,83 @@
+import pytest
+
+from solver import SEARCH_ORDERINGS, SearchSpace, remaining_space_size, search_validation_set
+from solver_profile import SolverProfile
+from conftest import candidate_at
+
+K = 3
+COST_OF_MISTAKE = 2
+
+
+@pytest.fixture
+def widened(group_variants):
+    """Earlier answers missing some of the options of group_variants, and those options"""
+    narrowed = [
+        [
+            (country, options[:-1] if (group + question) % 2 == 0 else options)
+            for question, (country, options) in enumerate(task)
+        ]
+        for group, task in enumerate(group_variants)
+    ]
+    new_options = {
+        (country, options[-1])
+        for task, old_task in zip(group_variants, narrowed)
+        for (country, options), (_, old_options) in zip(task, old_task)
+        if options != old_options
+    }
+    return narrowed, new_options
+
+def candidates_by_novelty(group_variants, new_options, canonical_order):
+    """First candidate rank using a new option and first one using none, as (hash, validation set, cost)"""
+    space = SearchSpace(
+        [[len(options) for _, options in task] for task in group_variants], K, COST_OF_MISTAKE, canonical_order
+    )
+    found = {}
+    for rank in range(space.size // 2, space.size):
+        candidate = candidate_at(group_variants, K, COST_OF_MISTAKE, rank, canonical_order)
+        found.setdefault(any(pair in new_options for pair in candidate[1]), candidate)
+        if len(found) == 2:
+            return found[True], found[False]
+
+@pytest.mark.parametrize('ordering', sorted(SEARCH_ORDERINGS))
+@pytest.mark.parametrize('canonical_order', [False, True])
+def test_delta_search_hashes_only_new_candidates(group_variants, widened, ordering, canonical_order):
+    narrowed, new_options = widened
+    iterator_class = SEARCH_ORDERINGS[ordering]
+    iterator = iterator_class(
+        group_variants, K, '0' * 64, COST_OF_MISTAKE, searched_data=narrowed, canonical_order=canonical_order
+    )
+    assert next(iterator) == ([], [], 0)
+    assert iterator.hashes_computed == remaining_space_size(
+        group_variants, K, COST_OF_MISTAKE, canonical_order, narrowed
+    )
+
+    fresh, searched = candidates_by_novelty(group_variants, new_options, canonical_order)
+    target_hash, validation_set, cost = fresh
+    iterator = iterator_class(
+        group_variants, K, target_hash, COST_OF_MISTAKE, searched_data=narrowed, canonical_order=canonical_order
+    )
+    result = next(iterator)
+    assert (result[0], result[2]) == (validation_set, cost)
+
+    iterator = iterator_class(
+        group_variants, K, searched[0], COST_OF_MISTAKE, searched_data=narrowed, canonical_order=canonical_order
+    )
+    assert next(iterator) == ([], [], 0)
+
+@pytest.mark.parametrize('ordering', sorted(SEARCH_ORDERINGS))
+def test_resubmission_searches_only_widened_answers(group_variants, widened, ordering):
+    narrowed, new_options = widened
+    (target_hash, validation_set, cost), _ = candidates_by_novelty(group_variants, new_options, False)
+    assert search_validation_set(narrowed, K, target_hash, COST_OF_MISTAKE, ordering=ordering) == ([], [], 0)
+
+    profile = SolverProfile(detailed=False)
+    result = search_validation_set(group_variants, K, target_hash, COST_OF_MISTAKE, profile=profile, ordering=ordering)
+    assert (result[0], result[2]) == (validation_set, cost)
+    assert profile.counters['hashes'] <= remaining_space_size(group_variants, K, COST_OF_MISTAKE, False, narrowed)
+
+    # Only removing capitals again is answered from the record without hashing
+    profile = SolverProfile(detailed=False)
+    assert search_validation_set(
+        narrowed, K, target_hash, COST_OF_MISTAKE, profile=profile, ordering=ordering
+    ) == ([], [], 0)
+    assert profile.counters['hashes'] == 0
@@ -0,0 +1,30 @@
+import hashlib
+import random
+
+import pytest
+
+from hash_backends import HashlibBackend, NumpyBackend, sha256_batch
+
+# Lengths around the padding edges: 55 still fits the length in one block, 56 spills it into a second
+PADDING_EDGE_LENGTHS = [0, 1, 55, 56, 63, 64, 65, 119, 120, 127, 128, 200]
+
+
+def test_sha256_batch_matches_hashlib_at_padding_edges():
+    rng = random.Random(0)
+    messages = [rng.randbytes(length) for length in PADDING_EDGE_LENGTHS]
+    assert sha256_batch(messages) == [hashlib.sha256(message).digest() for message in messages]
+
+
+def test_sha256_batch_matches_hashlib_on_mixed_lengths():
+    rng = random.Random(1)
+    messages = [rng.randbytes(rng.randint(0, 300)) for _ in range(500)]
+    assert sha256_batch(messages) == [hashlib.sha256(message).digest() for message in messages]
+
+
+@pytest.mark.parametrize('backend', [HashlibBackend(), NumpyBackend()])
+def test_find_match_returns_first_matching_index(backend):
+    messages = [bytes([i]) * length for i, length in enumerate(PADDING_EDGE_LENGTHS)]
+    messages.append(messages[3])
+    for idx in range(len(PADDING_EDGE_LENGTHS)):
+        assert backend.find_match(messages, hashlib.sha256(messages[idx]).digest()) == idx
+    assert backend.find_match(messages, bytes(32)) == -1
@@ -0,0 +1,60 @@
+import math
+
+import pytest
+
+import solver
+from solver import SEARCH_ORDERINGS, ConfidenceOrderIterator, SearchSpace
+from solver_profile import SolverProfile
+from conftest import candidate_at
+
+K = 3
+COST_OF_MISTAKE = 2
+
+
+def space_size(group_variants):
+    return SearchSpace([[len(options) for _, options in task] for task in group_variants], K, COST_OF_MISTAKE).size
+
+def test_confidence_candidates_come_band_by_band(group_variants):
+    iterator = ConfidenceOrderIterator(group_variants, K, '0' * 64, COST_OF_MISTAKE)
+    candidates = [(iterator.subset, iterator.choice)] + list(iterator.candidates)
+    assert len(set(candidates)) == len(candidates)
+    assert len(candidates) * math.factorial(K) * (COST_OF_MISTAKE + 1) == space_size(group_variants)
+
+    bands = []
+    for subset, choice in candidates:
+        costs = [question_costs for group in subset for question_costs in iterator.option_costs[group]]
+        cost = sum(question_costs[idx] for question_costs, idx in zip(costs, choice))
+        bands.append(math.floor((cost - iterator.top_cost) / solver.CONFIDENCE_BAND_BITS + 1e-6))
+    assert bands == sorted(bands)
+
+@pytest.mark.parametrize('ordering', sorted(SEARCH_ORDERINGS))
+def test_shards_split_the_space(group_variants, ordering):
+    hashes = []
+    for shard_index in range(3):
+        iterator = SEARCH_ORDERINGS[ordering](group_variants, K, '0' * 64, COST_OF_MISTAKE, shard=(shard_index, 3))
+        assert next(iterator) == ([], [], 0)
+        hashes.append(iterator.hashes_computed)
+    assert sum(hashes) == space_size(group_variants)
+    assert all(hashes)
+
+def test_confidence_without_midstate_cache_finds_the_same_match(group_variants, monkeypatch):
+    target_hash, validation_set, cost = candidate_at(group_variants, K, COST_OF_MISTAKE, space_size(group_variants) // 2)
+    cached = ConfidenceOrderIterator(group_variants, K, target_hash, COST_OF_MISTAKE)
+    monkeypatch.setattr(solver, 'KEYS_MIDSTATE_CACHE', 2)
+    uncached = ConfidenceOrderIterator(group_variants, K, target_hash, COST_OF_MISTAKE)
+    assert uncached.perms is None
+    for iterator in [cached, uncached]:
+        result = next(iterator)
+        assert (result[0], result[2]) == (validation_set, cost)
+    assert cached.hashes_computed == uncached.hashes_computed
+
+@pytest.mark.parametrize('ordering', sorted(SEARCH_ORDERINGS))
+def test_detailed_profile_times_every_ordering(group_variants, ordering):
+    profile = SolverProfile(detailed=True)
+    iterator = SEARCH_ORDERINGS[ordering](group_variants, K, '0' * 64, COST_OF_MISTAKE, profile=profile)
+    next(iterator)
+    report = profile.report()
+    assert report['hashes'] == iterator.hashes_computed == space_size(group_variants)
+    assert sum(entry['hashes'] for entry in report['subsets']) == report['hashes']
+    for phase in ['unit_setup', 'assembly', 'hashing']:
+        assert report['phases'][phase]['seconds'] > 0
@@ -0,0 +1,43 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from quiz_bank import QUESTION_COLUMNS, QUIZ_COLUMNS, generate_quizzes, sample_quiz_ids
+from solver import validation_message
+from capitals_gt import country_capitals as COUNTRY_CAPITALS
+
+
+@pytest.mark.parametrize('canonical_order', [False, True])
+def test_target_hashes_match_validation_message(canonical_order):
+    questions, quizzes = generate_quizzes(
+        25, num_questions=5, validation_size=3, questions_per_group=2, cost_of_mistake=10,
+        canonical_order=canonical_order, seed=1, chunk_size=10
+    )
+    assert len(quizzes) == 25 and len(questions) == 25 * 5 * 2
+    for quiz in quizzes.itertuples():
+        quiz_questions = questions[questions['quiz'] == quiz.quiz]
+        groups = [int(group) for group in quiz.validation_groups.split('|')]
+        if canonical_order:
+            assert groups == sorted(groups)
+        validation_set = [
+            (country, COUNTRY_CAPITALS[country])
+            for group in groups
+            for country in quiz_questions[quiz_questions['group'] == group]['country']
+        ]
+        expected = hashlib.sha256(validation_message(validation_set, quiz.cost).encode()).hexdigest()
+        assert quiz.target_hash == expected
+
+def test_options_hold_the_correct_capital_once():
+    country_ids, options, _ = sample_quiz_ids(np.random.default_rng(0), 50, 6, 2, 2)
+    assert np.all(np.sum(options == country_ids[..., None], axis=2) == 1)
+    assert np.all(np.sort(options, axis=2)[..., 1:] != np.sort(options, axis=2)[..., :-1])
+
+def test_no_quizzes_give_empty_tables():
+    questions, quizzes = generate_quizzes(0, num_questions=4, validation_size=2, questions_per_group=1, cost_of_mistake=0)
+    assert list(questions.columns) == QUESTION_COLUMNS and questions.empty
+    assert list(quizzes.columns) == QUIZ_COLUMNS and quizzes.empty
+
+def test_quizzes_larger_than_the_country_list_are_rejected():
+    with pytest.raises(ValueError):
+        sample_quiz_ids(np.random.default_rng(0), 1, len(COUNTRY_CAPITALS), 1, 2)
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+import solver
+from solver import SEARCH_ORDERINGS, SearchTimeout, load_checkpoint, remaining_space_size, search_validation_set
+from conftest import candidate_at
+
+K = 3
+COST_OF_MISTAKE = 2
+NO_MATCH = 'f' * 64
+
+
+@pytest.fixture(autouse=True)
+def frequent_polls(monkeypatch):
+    """Check the limits often enough for a small quiz to stop several times"""
+    monkeypatch.setattr(solver, 'POLL_INTERVAL', 64)
+
+@pytest.mark.parametrize('ordering', sorted(SEARCH_ORDERINGS))
+def test_max_hashes_stops_and_resumes_until_exhausted(group_variants, ordering):
+    space = remaining_space_size(group_variants, K, COST_OF_MISTAKE)
+    limit = space // 4
+    timeouts = 0
+    while True:
+        validation_set, last_attempts, cost = search_validation_set(
+            group_variants, K, NO_MATCH, COST_OF_MISTAKE, ordering=ordering, max_hashes=limit
+        )
+        if not isinstance(cost, SearchTimeout):
+            break
+        timeouts += 1
+        assert validation_set is None
+        assert len(last_attempts) == sum(len(task) for task in group_variants)
+        # Hashes count every run so far, each of which hashed at least limit new candidates
+        assert limit * timeouts <= cost.hashes < space
+        assert cost.fraction == cost.hashes / space
+        assert cost.checkpoint['shards'][0]['hashes_computed'] == cost.hashes
+    assert (validation_set, last_attempts, cost) == ([], [], 0)
+    assert 2 <= timeouts <= 4
+
+@pytest.mark.parametrize('ordering', sorted(SEARCH_ORDERINGS))
+def test_match_is_found_after_a_timeout(group_variants, ordering):
+    space = remaining_space_size(group_variants, K, COST_OF_MISTAKE)
+    target_hash, expected_set, expected_cost = candidate_at(group_variants, K, COST_OF_MISTAKE, space - 1)
+    validation_set, _, cost = search_validation_set(
+        group_variants, K, target_hash, COST_OF_MISTAKE, ordering=ordering, max_hashes=64
+    )
+    assert validation_set is None and isinstance(cost, SearchTimeout)
+
+    validation_set, _, cost = search_validation_set(group_variants, K, target_hash, COST_OF_MISTAKE, ordering=ordering)
+    assert (validation_set, cost) == (expected_set, expected_cost)
+
+def test_deadline_stops_and_checkpoints(group_variants):
+    validation_set, _, timeout = search_validation_set(group_variants, K, NO_MATCH, COST_OF_MISTAKE, deadline=0.0)
+    assert validation_set is None
+    assert isinstance(timeout, SearchTimeout)
+    assert timeout.hashes < remaining_space_size(group_variants, K, COST_OF_MISTAKE)
+    assert load_checkpoint(NO_MATCH, timeout.checkpoint['fingerprint'], 1) is not None
+
+@pytest.mark.parametrize('limits', [{'deadline': 1.0}, {'max_hashes': 10 ** 5}])
+def test_limits_stop_parallel_search(large_group_variants, limits):
+    started_at = time.monotonic()
+    validation_set, _, timeout = search_validation_set(large_group_variants, 4, NO_MATCH, 10, workers=2, **limits)
+    assert validation_set is None
+    assert isinstance(timeout, SearchTimeout)
+    assert 0 < timeout.fraction < 1
+    assert time.monotonic() - started_at < 30
+    if 'max_hashes' in limits:
+        assert timeout.hashes >= limits['max_hashes']
@@ -0,0 +1,77 @@
+import itertools
+import math
+import random
+
+import pytest
+
+import solver
+from solver import AllCombinationsIterator, SearchSpace, sum_over_k_subsets, unrank_permutation
+
+
+def test_sum_over_k_subsets_matches_brute_force():
+    rng = random.Random(0)
+    for _ in range(20):
+        lengths = [[rng.randint(1, 4) for _ in range(rng.randint(1, 3))] for _ in range(rng.randint(1, 6))]
+        k = rng.randint(1, len(lengths))
+        candidates = sum(
+            math.prod(math.prod(lengths[group]) for group in subset)
+            for subset in itertools.combinations(range(len(lengths)), k)
+        )
+        group_variants = [[('country', ['capital'] * length) for length in task] for task in lengths]
+        assert sum_over_k_subsets(group_variants, k) == candidates
+
+@pytest.mark.parametrize('k', range(1, 6))
+def test_unrank_permutation_matches_itertools(k):
+    expected = list(itertools.permutations(range(k)))
+    assert [unrank_permutation(rank, k) for rank in range(math.factorial(k))] == expected
+
+@pytest.mark.parametrize('canonical_order', [False, True])
+def test_rank_unrank_round_trip(canonical_order):
+    space = SearchSpace([[2, 3], [1], [4, 2], [3]], 2, 2, canonical_order)
+    candidates = [space.unrank(rank) for rank in range(space.size)]
+    assert len(set((subset, perm_idx, tuple(choice), cost) for subset, perm_idx, choice, cost in candidates)) == space.size
+    for rank, candidate in enumerate(candidates):
+        assert space.rank(*candidate) == rank
+
+def test_unrank_rejects_ranks_outside_the_space():
+    space = SearchSpace([[2], [3]], 1, 0)
+    with pytest.raises(ValueError):
+        space.unrank(space.size)
+
+def test_size_matches_brute_force():
+    rng = random.Random(1)
+    for _ in range(20):
+        lengths = [[rng.randint(1, 4) for _ in range(rng.randint(1, 3))] for _ in range(rng.randint(1, 6))]
+        k = rng.randint(1, len(lengths))
+        cost_of_mistake = rng.randint(0, 3)
+        canonical_order = rng.random() < 0.5
+        candidates = sum(
+            math.prod(math.prod(lengths[group]) for group in subset)
+            for subset in itertools.combinations(range(len(lengths)), k)
+        )
+        num_perms = 1 if canonical_order else math.factorial(k)
+        space = SearchSpace(lengths, k, cost_of_mistake, canonical_order)
+        assert space.size == candidates * num_perms * (cost_of_mistake + 1)
+
+def test_split_covers_the_space():
+    space = SearchSpace([[2, 3], [1], [4, 2], [3]], 3, 1)
+    ranges = space.split(7)
+    assert ranges[0][0] == 0 and ranges[-1][1] == space.size
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+
+def test_resumed_rank_range_hashes_every_rank_once(group_variants, monkeypatch):
+    monkeypatch.setattr(solver, 'POLL_INTERVAL', 64)
+    space = SearchSpace([[len(options) for _, options in task] for task in group_variants], 3, 2)
+    rank_range = (space.size // 4, space.size // 2)
+    polls = iter(range(2))
+    iterator = AllCombinationsIterator(
+        group_variants, 3, '0' * 64, 2,
+        should_stop=lambda: next(polls, None) is None,
+        rank_range=rank_range
+    )
+    assert next(iterator) == ([], [], 0) and iterator.stopped
+    resumed = AllCombinationsIterator(
+        group_variants, 3, '0' * 64, 2, rank_range=rank_range, resume_from=iterator.checkpoint()
+    )
+    assert next(resumed) == ([], [], 0) and resumed.finished
+    assert resumed.hashes_computed == rank_range[1] - rank_range[0]